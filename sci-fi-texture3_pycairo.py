@@ -17,6 +17,13 @@ testing environment :
 
 Changelog :
 
+version 0.1.1
+    * add : progress bar while drawing rects (rate-limited)
+    * update : draw_lines(), draw_grid() stroke same color lines as one path
+
+version 0.1.0
+    * update : get_rgba_str() use numpy if available (in place)
+
 version 0.0.9 2022/05/02 by mieki256
     * update : get_rgba_str()
 
@@ -55,6 +62,32 @@ import math
 import random
 import time
 import struct
+import sys
+
+
+# copied in random-boxes-pycairo.py : keep both copies byte-identical,
+# a change here must be made there too.
+class ProgressThrottle:
+    """Rate-limit gimp.progress_update() by wall-clock time.
+
+    gimp.progress_update() is a PDB call to the GIMP process.
+    update(count, total) maps count / total to start - end and sends
+    it at most once per interval (sec), and always at count == total.
+    """
+
+    def __init__(self, start=0.0, end=1.0, interval=0.2):
+        self.start = start
+        self.end = end
+        self.interval = interval
+        self.last = 0.0
+
+    def update(self, count, total):
+        t = time.time()
+        if count < total and t - self.last < self.interval:
+            return
+        self.last = t
+        v = float(count) / total if total > 0 else 1.0
+        gimp.progress_update(self.start + (self.end - self.start) * v)
 
 
 class DividedRect:
@@ -233,6 +266,26 @@ class SciFiTex:
             ctx.set_source_rgba(linecol, linecol, linecol, 1.0)
             ctx.stroke()
 
+    @staticmethod
+    def stroke_lines(ctx, data, batch=True):
+        """Stroke lines [[x0, y0, x1, y1, width, col], ...] in order.
+
+        batch : stroke consecutive lines of same width and color as one
+        path. Same output if the lines of a group do not overlap.
+        """
+        last = None
+        for x0, y0, x1, y1, brushsize, col in data:
+            if not batch or (brushsize, col) != last:
+                if last is not None:
+                    ctx.stroke()
+                last = (brushsize, col)
+                ctx.set_line_width(brushsize)
+                ctx.set_source_rgba(col, col, col)
+            ctx.move_to(x0, y0)
+            ctx.line_to(x1, y1)
+        if last is not None:
+            ctx.stroke()
+
     @staticmethod
     def draw_lines(area, spacing, linecol, linespc, horizontal, count, area_chk):
         _, _, _, _, w, h = area
@@ -277,12 +330,7 @@ class SciFiTex:
         ctx = cairo.Context(ims)
         ctx.set_line_cap(cairo.LINE_CAP_ROUND)
         ctx.set_line_join(cairo.LINE_JOIN_MITER)
-        for x0, y0, x1, y1, brushsize, col in data:
-            ctx.set_line_width(brushsize)
-            ctx.set_source_rgba(col, col, col)
-            ctx.move_to(x0, y0)
-            ctx.line_to(x1, y1)
-            ctx.stroke()
+        SciFiTex.stroke_lines(ctx, data)
 
         return ims
 
@@ -475,12 +523,7 @@ class SciFiTex:
         ctx = cairo.Context(ims)
         ctx.set_line_cap(cairo.LINE_CAP_ROUND)
         ctx.set_line_join(cairo.LINE_JOIN_MITER)
-        for x0, y0, x1, y1, brushsize, col in data:
-            ctx.set_line_width(brushsize)
-            ctx.set_source_rgba(col, col, col)
-            ctx.move_to(x0, y0)
-            ctx.line_to(x1, y1)
-            ctx.stroke()
+        SciFiTex.stroke_lines(ctx, data)
 
         return ims
 
@@ -716,8 +759,11 @@ class SciFiTex:
     @staticmethod
     def generate(imgw, imgh, rects, spc, borderradius,
                  rivet_enable, rivet_spc, rivet_size, rivet_h, rivet_bg, rivet_type,
-                 fill_col=None, drawtype="All", bordercol=64):
-        """Fill rectangles."""
+                 fill_col=None, drawtype="All", bordercol=64, progress=None):
+        """Fill rectangles.
+
+        progress : func(count, total) called before each rect, or None.
+        """
 
         surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, imgw, imgh)
         ctx = cairo.Context(surface)
@@ -731,7 +777,10 @@ class SciFiTex:
 
         pat_kind_lst = [0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6, 7, 7]
 
-        for rect in rects:
+        total = len(rects)
+        for i, rect in enumerate(rects):
+            if progress is not None:
+                progress(i, total)
             bx0, by0, bx1, by1 = rect
             x0 = math.floor(bx0 + spc)
             y0 = math.floor(by0 + spc)
@@ -826,17 +875,59 @@ class SciFiTex:
                     ctx.restore()
                     rsurf.finish()
 
+        if progress is not None:
+            progress(total, total)
         return surface
 
 
-def get_rgba_str(src):
-    """Convert cairo surface data to RGBA."""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# ARGB32 (native endian uint32) byte index -> R, G, B, A
+if sys.byteorder == "little":
+    RGBA_ORDER = [2, 1, 0, 3]
+else:
+    RGBA_ORDER = [1, 2, 3, 0]
+
+
+def get_rgba_str_py(src):
+    """Convert cairo surface data to RGBA. (pure python)"""
     lmax = len(src) / 4
     argb = list(struct.unpack("=%dL" % lmax, src))
     rgba = [(((d & 0x0ffffff) << 8) + ((d >> 24) & 0x0ff)) for d in argb]
     return struct.pack(">%dL" % lmax, *rgba)
 
 
+def get_rgba_str(src):
+    """Convert cairo surface data to RGBA.
+
+    Use numpy if available : swap the channels to R, G, B, A in place
+    on the cairo buffer and return it (src is changed). Only one
+    channel (1/4 of the image) is copied.
+    """
+    if numpy is None:
+        return get_rgba_str_py(src)
+    a = numpy.frombuffer(src, dtype=numpy.uint8).reshape(-1, 4)
+    if not a.flags.writeable:
+        return a[:, RGBA_ORDER].tobytes()
+    # move channels along the cycles of RGBA_ORDER
+    done = [False] * 4
+    for i in range(4):
+        if done[i] or RGBA_ORDER[i] == i:
+            continue
+        t = a[:, i].copy()
+        j = i
+        while RGBA_ORDER[j] != i:
+            a[:, j] = a[:, RGBA_ORDER[j]]
+            done[j] = True
+            j = RGBA_ORDER[j]
+        a[:, j] = t
+        done[j] = True
+    return src
+
+
 def generate_scifi_texture_pycairo(img, layer,
                                    dmin, dmax, cntmax, spc, borderradius,
                                    rivet_enable, rivet_type, rivet_bg,
@@ -892,11 +983,14 @@ def generate_scifi_texture_pycairo(img, layer,
     nseed = DividedRect.init_random_seed(seed, randomize)
     # gimp.message("seed = %d" % (seed))
 
+    gimp.progress_init("seed = %d" % (nseed))
+    prog = ProgressThrottle(0.0, 0.8)
+
     rects = DividedRect.get_divide_rectangles(w, h, dmin, dmax, cntmax)
     newsurf = SciFiTex.generate(w, h, rects, spc, borderradius,
                                 rivet_enable, rivet_spc, rivet_size, rivet_h,
                                 rivet_bg, rivet_type, fillcol, drawtype,
-                                bordercol)
+                                bordercol, prog.update)
 
     pdb.gimp_image_undo_group_start(img)
     pdb.gimp_selection_none(img)
@@ -907,8 +1001,6 @@ def generate_scifi_texture_pycairo(img, layer,
     layer.fill(TRANSPARENT_FILL)
     img.add_layer(layer, 0)
 
-    gimp.progress_init("seed = %d" % (nseed))
-
     # transfer gimp layer
     src = newsurf.get_data()
     dst = get_rgba_str(src)
@@ -921,8 +1013,6 @@ def generate_scifi_texture_pycairo(img, layer,
     layer.update(0, 0, w, h)
     gimp.progress_update(1.0)
 
-    # gimp.progress_update(float(i + 1) / len(rects))
-
     pdb.gimp_progress_end()
 
     # gimp.set_foreground(old_color)
@@ -0,0 +1,876 @@
+#!python
+# -*- mode: python; Encoding: utf-8; coding: utf-8 -*-
+"""
+Benchmarks for scifitex.py.
+
+usage:
+    python bench_scifitex.py              # run all
+    python bench_scifitex.py scratch      # run one
+    python bench_scifitex.py scratch --size 4096 --cntmax 6
+    python bench_scifitex.py lines
+
+Author: mieki256
+License: CC0 / Public Domain
+require: Python, pycairo
+
+"""
+
+import os
+import sys
+import ast
+import hashlib
+import time
+import struct
+import random
+import argparse
+import threading
+import multiprocessing
+
+import cairo
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import scifitex
+from scifitex import DividedRect, SciFiTex, SurfacePool, RivetStampCache
+
+# failed checks, main() exits with an error if any
+FAILED = []
+
+
+def get_rects(args):
+    DividedRect.init_random_seed(args.seed, False)
+    return DividedRect.get_divide_rectangles(args.size, args.size, 1, 3, args.cntmax)
+
+
+def render(args, rects, **kw):
+    DividedRect.init_random_seed(args.seed, False)
+    return SciFiTex.generate(args.size, args.size, rects, 2, 2,
+                             True, 8, 9, 12, False, "Circle", None, "All", 64, **kw)
+
+
+def surface_bytes(surface):
+    surface.flush()
+    return bytes(surface.get_data())
+
+
+def check(ok, name):
+    """Record a failed check. Return ok."""
+    if not ok:
+        FAILED.append(name)
+        print("  FAIL : %s" % name)
+    return ok
+
+
+def timeit(func, repeat):
+    """Return (best time, last result)."""
+    best = None
+    result = None
+    for i in range(repeat):
+        t = time.time()
+        result = func()
+        t = time.time() - t
+        best = t if best is None else min([best, t])
+    return best, result
+
+
+def peak_memory(func):
+    """Return peak python heap (MB) used by func(). None if no tracemalloc."""
+    try:
+        import tracemalloc
+    except ImportError:
+        return None
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / (1024.0 * 1024.0)
+
+
+def fmt_mb(v):
+    return "-" if v is None else "%.1f MB" % v
+
+
+def divide_both(seed, size, dmin, dmax, cntmax):
+    """Return (div_rect() func, divide() func) for one layout."""
+    def run_rec():
+        DividedRect.init_random_seed(seed, False)
+        return DividedRect.div_rect([], 0, 0, size - 1, size - 1,
+                                    1, 0, cntmax, dmin, max([dmin, dmax]))
+
+    def run_iter():
+        DividedRect.init_random_seed(seed, False)
+        return DividedRect.divide(size, size, dmin, dmax, cntmax)
+
+    return run_rec, run_iter
+
+
+def bench_divide(args):
+    """DividedRect : recursive div_rect() vs iterative divide()."""
+    print("divide : %dx%d" % (args.size, args.size))
+    for dmin, dmax, cntmax in [[1, 3, args.cntmax], [2, 6, 6], [4, 10, 5], [10, 10, 4]]:
+        run_rec, run_iter = divide_both(args.seed, args.size, dmin, dmax, cntmax)
+
+        t0, r0 = timeit(run_rec, args.repeat)
+        t1, r1 = timeit(run_iter, args.repeat)
+        m0 = peak_memory(run_rec)
+        m1 = peak_memory(run_iter)
+        same = [tuple(r) for r in r0] == list(r1)
+        print("  d %2d-%2d, cntmax %d, %7d rects : div_rect %.3f sec %s,"
+              " divide %.3f sec %s, identical %s"
+              % (dmin, dmax, cntmax, len(r1), t0, fmt_mb(m0), t1, fmt_mb(m1), same))
+        check(same, "divide d %d-%d, cntmax %d : differs from div_rect()"
+              % (dmin, dmax, cntmax))
+
+    # same layout as div_rect() for more seeds and sizes
+    count = 0
+    for seed in range(args.seed, args.seed + 10):
+        for size in [16, 257, 1000, args.size]:
+            for dmin, dmax, cntmax in [[1, 3, 5], [2, 6, 4], [3, 3, 6]]:
+                run_rec, run_iter = divide_both(seed, size, dmin, dmax, cntmax)
+                same = [tuple(r) for r in run_rec()] == list(run_iter())
+                check(same, "divide seed %d, size %d, d %d-%d, cntmax %d :"
+                      " differs from div_rect()" % (seed, size, dmin, dmax, cntmax))
+                count += 1
+    print("  %d more layouts (10 seeds, 4 sizes) compared with div_rect()" % count)
+
+    for max_rects, min_size in [[20000, 0], [0, 4]]:
+        stats = {}
+        DividedRect.init_random_seed(args.seed, False)
+        t, _ = timeit(lambda: DividedRect.divide(args.size, args.size, 4, 10, 5,
+                                                 max_rects, min_size, stats), 1)
+        print("  d  4-10, cntmax 5, max_rects %5d, min_size %d : %.3f sec, %d rects,"
+              " %d culled, %d budget stops"
+              % (max_rects, min_size, t, stats["rects"], stats["culled"],
+                 stats["budget_stops"]))
+
+
+def bench_scratch(args):
+    """Pattern scratch surface : new surface per rect vs SurfacePool."""
+    rects = get_rects(args)
+
+    t0, surf0 = timeit(lambda: render(args, rects, pool=None), args.repeat)
+
+    pools = []
+
+    def run_pool():
+        pools.append(SurfacePool())
+        return render(args, rects, pool=pools[-1])
+
+    t1, surf1 = timeit(run_pool, args.repeat)
+    pool = pools[-1]
+    pool.finish()
+
+    print("scratch : %dx%d, cntmax=%d, %d rects"
+          % (args.size, args.size, args.cntmax, len(rects)))
+    print("  new surface per rect : %.3f sec, %d allocs" % (t0, pool.requests))
+    print("  SurfacePool          : %.3f sec, %d allocs" % (t1, pool.allocs))
+    same = surface_bytes(surf0) == surface_bytes(surf1)
+    print("  identical output     : %s" % same)
+    check(same, "scratch : SurfacePool output differs")
+
+
+def max_diff(a, b):
+    """Max difference of two byte strings (per channel)."""
+    return max([abs(x - y) for x, y in zip(bytearray(a), bytearray(b))] + [0])
+
+
+def bench_rivet(args):
+    """Circle rivet : fill per ring vs one radial gradient fill."""
+    count = 200
+    print("rivet : draw_rivet x %d, loop vs gradient (max diff must be <= 1)" % count)
+    for size, rivet_h, bg, spc in [[9, 12, False, 8], [32, 12, False, 8],
+                                   [64, 12, False, 8], [64, 64, False, 8],
+                                   [64, 128, False, 8], [64, 255, False, 8],
+                                   [16, 255, False, 8], [32, 12, True, 8],
+                                   [64, 128, True, 8], [64, 64, False, 60]]:
+        # spc 60 : the rivets overlap
+        sw = size * 2 + 40
+        area = (0, 0, sw, sw, sw, sw)
+        res = []
+        for gradient in [False, True]:
+            def run():
+                for i in range(count):
+                    surf = SciFiTex.draw_rivet(area, 0.5, size, spc, rivet_h, bg, 0,
+                                               None, gradient)
+                return surface_bytes(surf)
+
+            res.append(timeit(run, args.repeat))
+
+        (t0, b0), (t1, b1) = res
+        diff = max_diff(b0, b1)
+        print("  size %2d, height %3d, bg %-5s, spc %2d : loop %.3f sec, gradient %.3f sec,"
+              " x%.1f, max diff %d"
+              % (size, rivet_h, bg, spc, t0, t1, t0 / max([t1, 1e-9]), diff))
+        check(diff <= 1, "rivet size %d, height %d, bg %s, spc %d : max diff %d"
+              % (size, rivet_h, bg, spc, diff))
+
+
+def get_grid_lines(size, linespc, count):
+    """Dense draw_grid() style lines : fg horizontal lines, bg vertical lines."""
+    data = []
+    y = 8 + 3.5
+    while y < size - 8 + 3.5:
+        data.append([12, y, size - 12, y, 5, 0.0])
+        y = y + linespc
+    dd = float(size - 18) / count
+    x = 9 + dd
+    for i in range(count - 1):
+        data.append([x, 0, x, size, 3, 0.5])
+        x = x + dd
+    return data
+
+
+def bench_lines(args):
+    """stroke_lines() : stroke per line vs one path per (width, color)."""
+    count = 20
+    print("lines : draw_grid() style lines, stroke_lines() x %d" % count)
+    for size, linespc, cols in [[64, 12, 4], [256, 12, 6], [512, 8, 32], [1024, 6, 128]]:
+        data = get_grid_lines(size, linespc, cols)
+        res = []
+        for batch in [False, True]:
+            def run():
+                for i in range(count):
+                    surf, ctx = SciFiTex.new_surface(size, size)
+                    ctx.set_line_cap(cairo.LINE_CAP_ROUND)
+                    ctx.set_line_join(cairo.LINE_JOIN_MITER)
+                    SciFiTex.stroke_lines(ctx, data, batch)
+                return surface_bytes(surf)
+
+            res.append(timeit(run, args.repeat))
+
+        (t0, b0), (t1, b1) = res
+        print("  %4dx%-4d %4d lines : per line %.3f sec, batch %.3f sec, x%.1f,"
+              " identical %s"
+              % (size, size, len(data), t0, t1, t0 / max([t1, 1e-9]), b0 == b1))
+        check(b0 == b1, "lines %dx%d : batch output differs" % (size, size))
+
+
+def bench_stamps(args):
+    """Circle rivets : draw per tile vs RivetStampCache, over several images."""
+    count = 4
+    print("stamps : %d images %dx%d, cntmax=%d, Circle rivet"
+          % (count, args.size, args.size, args.cntmax))
+    for fill_col in [None, 160 / 256.0]:
+        for rivet_bg in [False, True]:
+            cache = RivetStampCache()
+            res = []
+            for stamps in [None, cache]:
+                def run():
+                    for i in range(count):
+                        DividedRect.init_random_seed(args.seed + i, False)
+                        rects = DividedRect.get_divide_rectangles(args.size, args.size,
+                                                                  1, 3, args.cntmax)
+                        surf = SciFiTex.generate(args.size, args.size, rects, 2, 2,
+                                                 True, 8, 9, 12, rivet_bg, "Circle",
+                                                 fill_col, "All", 64, stamps=stamps)
+                    return surface_bytes(surf)
+
+                res.append(timeit(run, 1))
+
+            (t0, b0), (t1, b1) = res
+            fill = "random" if fill_col is None else "fixed"
+            print("  fill %-9s bg %-5s : direct %.3f sec, stamps %.3f sec,"
+                  " %d hits, %d misses (%.1f%%), identical %s"
+                  % (fill, rivet_bg, t0, t1, cache.hits, cache.misses,
+                     100.0 * cache.get_hit_rate(), b0 == b1))
+            check(b0 == b1, "stamps fill %s, bg %s : output differs" % (fill, rivet_bg))
+            cache.clear()
+
+
+def load_plugin_funcs(path, names):
+    """Get top-level functions / variables of a GIMP plug-in without
+    importing gimpfu.
+
+    Only the "def name" and "if ...: name = ..." blocks of names are run,
+    with numpy, struct and sys as globals. Return dict of name: value.
+    """
+    with open(path) as f:
+        src = f.read()
+    lines = src.splitlines(True)
+    body = ast.parse(src).body
+    code = []
+    for i, node in enumerate(body):
+        if isinstance(node, ast.FunctionDef):
+            found = node.name in names
+        elif isinstance(node, ast.If):
+            found = False
+            for n in node.body:
+                if isinstance(n, ast.Assign):
+                    found = found or any([getattr(t, "id", None) in names for t in n.targets])
+        else:
+            found = False
+        if found:
+            end = body[i + 1].lineno - 1 if i + 1 < len(body) else len(lines)
+            code.append("".join(lines[node.lineno - 1:end]))
+    ns = {"numpy": numpy, "struct": struct, "sys": sys}
+    exec("".join(code), ns)
+    return dict([(k, ns[k]) for k in names])
+
+
+def bench_rgba(args):
+    """Plug-in get_rgba_str() : struct (pure python) vs numpy in place."""
+    if numpy is None:
+        print("rgba : numpy not found. skip")
+        return
+
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                        "sci-fi-texture3_pycairo.py")
+    funcs = load_plugin_funcs(path, ["RGBA_ORDER", "get_rgba_str_py", "get_rgba_str"])
+    conv_py, conv = funcs["get_rgba_str_py"], funcs["get_rgba_str"]
+
+    # get_rgba_str() changes its argument : give each call a copy
+    src = bytearray(os.urandom(args.size * args.size * 4))
+    d0 = conv_py(bytearray(src))
+    d1 = bytes(conv(bytearray(src)))
+    buf = bytearray(src)
+    t0, _ = timeit(lambda: conv_py(buf), 1)
+    t1, _ = timeit(lambda: conv(buf), args.repeat)
+    m0 = peak_memory(lambda: conv_py(buf))
+    m1 = peak_memory(lambda: conv(buf))
+    print("rgba : sci-fi-texture3_pycairo.py get_rgba_str() %dx%d" % (args.size, args.size))
+    print("  struct : %.3f sec, peak %s" % (t0, fmt_mb(m0)))
+    print("  numpy  : %.3f sec, peak %s, x%.1f" % (t1, fmt_mb(m1), t0 / max([t1, 1e-9])))
+    print("  identical output : %s" % (d0 == d1))
+    check(d0 == d1, "rgba : numpy output differs from struct")
+
+
+def conv_split_merge(surface):
+    """Old MyApp.conv_surface_to_pil_image() (Python 3.x)."""
+    from PIL import Image
+
+    w, h = surface.get_width(), surface.get_height()
+    im = Image.frombuffer("RGBA", (w, h), surface.get_data(), "raw", "RGBA", 0, 1)
+    r, g, b, a = im.split()
+    return Image.merge("RGBA", (b, g, r, a))
+
+
+def pil_child(q, size, name, repeat):
+    """Measure one conversion in a fresh process. Put (time, peak rss MB)."""
+    import resource
+
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, size, size)
+    ctx = cairo.Context(surface)
+    ctx.set_source_rgb(0.25, 0.5, 0.75)
+    ctx.paint()
+    surface.flush()
+    conv = conv_split_merge if name == "split" else scifitex.surface_to_pil_image
+
+    rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t, im = timeit(lambda: conv(surface), repeat)
+    rss1 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    q.put((t, (rss1 - rss0) / 1024.0, im.tobytes()))
+
+
+def bench_pil(args):
+    """Surface -> PIL Image : split / merge vs raw mode BGRA."""
+    res = {}
+    for name in ["split", "rawmode"]:
+        q = multiprocessing.Queue()
+        p = multiprocessing.Process(target=pil_child, args=(q, args.size, name, args.repeat))
+        p.start()
+        res[name] = q.get()
+        p.join()
+
+    print("pil : surface -> PIL Image %dx%d (peak rss growth, Linux)" % (args.size, args.size))
+    for name in ["split", "rawmode"]:
+        t, rss, _ = res[name]
+        print("  %-7s : %.4f sec, peak %s" % (name, t, fmt_mb(rss)))
+    same = res["split"][2] == res["rawmode"][2]
+    print("  identical output : %s" % same)
+    check(same, "pil : rawmode output differs from split / merge")
+
+
+def region_digest(surface, x, y, w, h):
+    """md5 of the pixels of (x, y, w, h) (without stride padding)."""
+    surface.flush()
+    data = surface.get_data()
+    stride = surface.get_stride()
+    m = hashlib.md5()
+    for yy in range(y, y + h):
+        i = yy * stride + x * 4
+        m.update(bytes(data[i:i + w * 4]))
+    return m.hexdigest()
+
+
+def tiles_child(q, args, tile, name):
+    """Render the whole image or its tiles in a fresh process.
+
+    Put (time, peak rss growth MB, {(x, y): tile digest}).
+    """
+    import resource
+
+    rects = get_rects(args)
+    gen_args = (2, 2, True, 8, 9, 12, False, "Circle", None, "All", 64)
+    size = args.size
+    digests = {}
+
+    def run_full():
+        surf = SciFiTex.generate(size, size, rects, *gen_args, seed=args.seed)
+        for y in range(0, size, tile):
+            for x in range(0, size, tile):
+                w, h = min([tile, size - x]), min([tile, size - y])
+                digests[(x, y)] = region_digest(surf, x, y, w, h)
+        surf.finish()
+
+    def run_tiles():
+        for x, y, surf in SciFiTex.generate_tiles(size, size, rects, tile,
+                                                  args.seed, *gen_args):
+            digests[(x, y)] = region_digest(surf, 0, 0,
+                                            surf.get_width(), surf.get_height())
+            surf.finish()
+
+    rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t, _ = timeit(run_full if name == "full" else run_tiles, 1)
+    rss1 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    q.put((t, (rss1 - rss0) / 1024.0, digests))
+
+
+def png_child(q, params, name, path):
+    """Render and write one png in a fresh process. Put (time, peak rss MB)."""
+    import resource
+    import scifitex_png
+
+    def run():
+        if name == "pil":
+            surface, _ = scifitex.render_texture(params)
+            scifitex.surface_to_pil_image(surface).convert("RGB").save(path)
+        else:
+            scifitex_png.write_texture_png(params, path)
+
+    rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t, _ = timeit(run, 1)
+    rss1 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    q.put((t, (rss1 - rss0) / 1024.0, os.path.getsize(path)))
+
+
+def bench_png(args):
+    """Render + save png : full surface + PIL RGB vs scifitex_png row bands."""
+    import tempfile
+    from PIL import Image
+
+    params = {"imgsize": args.size, "cntmax": args.cntmax, "seed": args.seed,
+              "rect_seed": True}
+    print("png : %dx%d render + save (peak rss growth, Linux)" % (args.size, args.size))
+    gray = {}
+    for name in ["pil", "stream"]:
+        fd, path = tempfile.mkstemp(".png")
+        os.close(fd)
+        q = multiprocessing.Queue()
+        p = multiprocessing.Process(target=png_child, args=(q, params, name, path))
+        p.start()
+        t, rss, size = q.get()
+        p.join()
+        im = Image.open(path)
+        gray[name] = im.split()[1].tobytes() if im.mode == "RGB" else im.tobytes()
+        im.close()
+        os.remove(path)
+        print("  %-6s : %.3f sec, peak %s, file %.1f MB"
+              % (name, t, fmt_mb(rss), size / (1024.0 * 1024.0)))
+    same = gray["pil"] == gray["stream"]
+    print("  identical gray : %s" % same)
+    check(same, "png : streamed png differs from the PIL save")
+
+
+def bench_raw(args):
+    """scifitex_raw : heap surface + png vs mmap raw file, write and read back."""
+    if numpy is None:
+        print("raw : numpy not found. skip")
+        return
+
+    import tempfile
+    import scifitex_raw
+    from PIL import Image
+
+    params = {"imgsize": args.size, "cntmax": args.cntmax, "seed": args.seed}
+    tmpdir = tempfile.mkdtemp()
+    png = os.path.join(tmpdir, "bench.png")
+    raw = os.path.join(tmpdir, "bench.raw")
+
+    def run_png():
+        surface, _ = scifitex.render_texture(params)
+        surface.write_to_png(png)
+        surface.finish()
+
+    def run_raw():
+        r, _ = scifitex_raw.render_texture_raw(params, raw)
+        r.close()
+
+    def read_png():
+        return numpy.asarray(Image.open(png).convert("L"))
+
+    def read_raw():
+        r = scifitex_raw.RawImage(raw)
+        g = r.get_gray()
+        s = int(g[::64, ::64].sum())
+        del g
+        r.close()
+        return s
+
+    t0, _ = timeit(run_png, 1)
+    t1, _ = timeit(run_raw, 1)
+    t2, _ = timeit(read_png, args.repeat)
+    t3, _ = timeit(read_raw, args.repeat)
+    print("raw : %dx%d, cntmax=%d" % (args.size, args.size, args.cntmax))
+    print("  png : render + write %.3f sec, read gray %.4f sec, file %.1f MB"
+          % (t0, t2, os.path.getsize(png) / (1024.0 * 1024.0)))
+    print("  raw : render + write %.3f sec, read gray %.4f sec, file %.1f MB (mmap)"
+          % (t1, t3, os.path.getsize(raw) / (1024.0 * 1024.0)))
+    r = scifitex_raw.RawImage(raw)
+    same = numpy.array_equal(read_png(), r.get_gray())
+    r.close()
+    print("  identical gray : %s" % same)
+    check(same, "raw : raw file gray differs from the png")
+    os.remove(png)
+    os.remove(raw)
+    os.rmdir(tmpdir)
+
+
+def bench_makeup(args):
+    """scifitex_makeup : NumPy port of the makeup script at 1k / 2k / 4k."""
+    if numpy is None:
+        print("makeup : numpy not found. skip")
+        return
+
+    import scifitex_makeup
+
+    # plug-in-emboss 120 40 6 on RGB gray : flat = floor(Lz), Nz = 6 * 255 / depth
+    a = numpy.full((5, 6), 100.0, numpy.float32)
+    flat = scifitex_makeup.emboss(a, 1, *scifitex_makeup.EMBOSS)
+    a[:, 3:] = 101.0
+    vstep = scifitex_makeup.emboss(a, 1, *scifitex_makeup.EMBOSS)
+    a = numpy.full((5, 6), 100.0, numpy.float32)
+    a[3:] = 101.0
+    hstep = scifitex_makeup.emboss(a, 1, *scifitex_makeup.EMBOSS)
+    print("makeup : emboss flat %d, 1 level step %d / %d (GIMP 164, 167 / 170)"
+          % (flat[1, 1], vstep[1, 1], hstep[1, 1]))
+    check((flat == 164).all(), "emboss flat : %d, GIMP 164" % flat.max())
+    check(vstep[1, 1] == 167 and vstep[1, 0] == 164,
+          "emboss 1 level step : %d, GIMP 167" % vstep[1, 1])
+    check(hstep[1, 1] == 170, "emboss 1 level step : %d, GIMP 170" % hstep[1, 1])
+
+    # the band size must not change the result
+    gray = numpy.random.RandomState(args.seed).randint(0, 256, (300, 257)).astype(numpy.uint8)
+    same = all([(scifitex_makeup.makeup(gray, band) == scifitex_makeup.makeup(gray)).all()
+                for band in [7, 100]])
+    print("makeup : band 7 / 100 / %d identical %s" % (scifitex_makeup.BAND, same))
+    check(same, "makeup : output depends on the band size")
+
+    print("makeup : emboss, gauss, edge, 3 solid noise layers, band %d rows"
+          % scifitex_makeup.BAND)
+    for size in [1024, 2048, 4096]:
+        surface, _ = scifitex.render_texture({"imgsize": size, "seed": args.seed})
+        gray = scifitex_makeup.surface_to_gray(surface)
+        surface.finish()
+        t, _ = timeit(lambda: scifitex_makeup.makeup(gray), 1)
+        m = peak_memory(lambda: scifitex_makeup.makeup(gray))
+        print("  %dx%d : %.3f sec, %.2f Mpixel/sec, peak %s"
+              % (size, size, t, size * size / (t * 1000000.0), fmt_mb(m)))
+
+
+def bench_maps(args):
+    """scifitex_maps : normal / ao / roughness from the bump surface."""
+    if numpy is None:
+        print("maps : numpy not found. skip")
+        return
+
+    import scifitex_maps
+
+    print("maps : normal (Sobel), ao (cavity), roughness")
+    for size in [1024, 2048, 4096]:
+        surface, _ = scifitex.render_texture({"imgsize": size, "seed": args.seed})
+        t, _ = timeit(lambda: scifitex_maps.get_surface_maps(surface), args.repeat)
+        m = peak_memory(lambda: scifitex_maps.get_surface_maps(surface))
+        surface.finish()
+        print("  %dx%d : %.3f sec, %.2f Mpixel/sec, peak %s"
+              % (size, size, t, size * size / (t * 1000000.0), fmt_mb(m)))
+
+
+def bench_atlas(args):
+    """scifitex_atlas : cells one by one + stitch vs render_atlas()."""
+    import scifitex_atlas
+
+    size = 256
+    for count in [16, 64, 256]:
+        plist = [{"seed": args.seed + i, "imgsize": size} for i in range(count)]
+
+        def run_stitch():
+            w, h, _, _, cells = scifitex_atlas.get_atlas_layout(plist)
+            dst = cairo.ImageSurface(cairo.FORMAT_ARGB32, w, h)
+            ctx = cairo.Context(dst)
+            for p, (x, y, cw, ch) in zip(plist, cells):
+                surf, _ = scifitex.render_texture(p)
+                ctx.set_source_surface(surf, x, y)
+                ctx.paint()
+                surf.finish()
+            return dst
+
+        t0, surf0 = timeit(run_stitch, 1)
+        print("atlas : %d cells %dx%d, %dx%d"
+              % (count, size, size, surf0.get_width(), surf0.get_height()))
+        print("  render + stitch       : %.3f sec" % t0)
+        ref = surface_bytes(surf0)
+        for n in sorted(set([1, multiprocessing.cpu_count()])):
+            t, (surf, m) = timeit(lambda: scifitex_atlas.render_atlas(plist, processes=n), 1)
+            c = m["cells"][-1]
+            cell = scifitex.render_texture(plist[-1])[0]
+            same = surface_bytes(surf) == ref
+            cell_same = (region_digest(surf, c["x"], c["y"], c["w"], c["h"])
+                         == region_digest(cell, 0, 0, c["w"], c["h"]))
+            print("  render_atlas %2d proc. : %.3f sec, identical %s, cell identical %s"
+                  % (n, t, same, cell_same))
+            check(same, "atlas %d cells, %d processes : differs from render + stitch"
+                  % (count, n))
+            check(cell_same, "atlas %d cells, %d processes : last cell differs from"
+                  " render_texture()" % (count, n))
+
+
+def gray_child(q, args, size, name):
+    """Render ARGB32 or A8 in a fresh process.
+
+    Put (time, peak rss growth MB, md5 of the gray bytes).
+    """
+    import resource
+
+    params = {"imgsize": size, "cntmax": args.cntmax, "seed": args.seed,
+              "rect_seed": True}
+    if name == "argb32":
+        func = scifitex.render_texture
+    else:
+        func = scifitex.render_texture_gray
+
+    rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t, (surf, _) = timeit(lambda: func(params), 1)
+    rss1 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    surf.flush()
+    data = surf.get_data()
+    stride = surf.get_stride()
+    m = hashlib.md5()
+    for y in range(size):
+        if name == "argb32":
+            m.update(bytes(data[y * stride + scifitex.RGBA_ORDER[1]:(y + 1) * stride:4]))
+        else:
+            m.update(bytes(data[y * stride:y * stride + size]))
+    q.put((t, (rss1 - rss0) / 1024.0, m.hexdigest()))
+
+
+def bench_gray(args):
+    """render_texture_gray() (A8) vs render_texture() (ARGB32) at 4096 x 4096."""
+    size = 4096
+    res = {}
+    for name in ["argb32", "a8"]:
+        q = multiprocessing.Queue()
+        p = multiprocessing.Process(target=gray_child, args=(q, args, size, name))
+        p.start()
+        res[name] = q.get()
+        p.join()
+
+    print("gray : %dx%d, cntmax=%d (peak rss growth, Linux)" % (size, size, args.cntmax))
+    print("  ARGB32 : %.3f sec, peak %s" % (res["argb32"][0], fmt_mb(res["argb32"][1])))
+    print("  A8     : %.3f sec, peak %s (ARGB32 tiles copied into A8)"
+          % (res["a8"][0], fmt_mb(res["a8"][1])))
+    same = res["argb32"][2] == res["a8"][2]
+    print("  identical gray : %s" % same)
+    check(same, "gray : A8 gray differs from render_texture()")
+
+
+def height_child(q, args, name):
+    """Render 8 bit (ARGB32) or float heights in a fresh process.
+
+    Put (time, peak rss growth MB, (h, w) gray array 0.0 - 255.0).
+    """
+    import resource
+    import scifitex_height
+
+    params = {"imgsize": args.size, "cntmax": args.cntmax, "seed": args.seed,
+              "rivet_type": "Circle", "rivet_size": 32, "rect_seed": True}
+    rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if name == "argb32":
+        t, (surf, _) = timeit(lambda: scifitex.render_texture(params), 1)
+    else:
+        t, (height, _) = timeit(lambda: scifitex_height.render_texture_height(params), 1)
+    rss1 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    if name == "argb32":
+        gray = numpy.frombuffer(surface_bytes(surf), numpy.uint8)[scifitex.RGBA_ORDER[1]::4]
+        gray = gray.reshape(args.size, args.size).astype(numpy.float32)
+    else:
+        gray = height * 255.0
+    q.put((t, (rss1 - rss0) / 1024.0, gray))
+
+
+def bench_height(args):
+    """scifitex_height : 8-bit render vs float (RGBA128F) heights."""
+    if numpy is None:
+        print("height : numpy not found. skip")
+        return
+
+    import scifitex_height
+
+    if not scifitex_height.has_float_format():
+        print("height : cairo FORMAT_RGBA128F not available (cairo %s). skip"
+              % cairo.cairo_version_string())
+        return
+
+    res = {}
+    for name in ["argb32", "float"]:
+        q = multiprocessing.Queue()
+        p = multiprocessing.Process(target=height_child, args=(q, args, name))
+        p.start()
+        res[name] = q.get()
+        p.join()
+
+    gray, height = res["argb32"][2], res["float"][2]
+    levels0 = len(numpy.unique(gray))
+    levels1 = len(numpy.unique(scifitex_height.height_to_uint16(height / 255.0)))
+    diff = numpy.abs(height - gray).max()
+
+    print("height : %dx%d, cntmax=%d, Circle rivet size 32 (peak rss growth, Linux)"
+          % (args.size, args.size, args.cntmax))
+    print("  ARGB32 8 bit : %.3f sec, peak %s, %d levels"
+          % (res["argb32"][0], fmt_mb(res["argb32"][1]), levels0))
+    print("  float        : %.3f sec, peak %s, %d levels (16 bit)"
+          % (res["float"][0], fmt_mb(res["float"][1]), levels1))
+    print("  max diff to 8 bit : %.2f / 255" % diff)
+    check(height.shape == gray.shape, "height : shape differs from render_texture()")
+    check(levels1 >= levels0, "height : fewer levels than the 8 bit render")
+
+
+def bench_tiles(args):
+    """generate(seed=...) vs generate_tiles() : time, peak memory, same output."""
+    tile = 512
+    res = {}
+    for name in ["full", "tiles"]:
+        q = multiprocessing.Queue()
+        p = multiprocessing.Process(target=tiles_child, args=(q, args, tile, name))
+        p.start()
+        res[name] = q.get()
+        p.join()
+
+    print("tiles : %dx%d, tile %d (peak rss growth, Linux)" % (args.size, args.size, tile))
+    for name in ["full", "tiles"]:
+        t, rss, _ = res[name]
+        print("  %-5s : %.3f sec, peak %s" % (name, t, fmt_mb(rss)))
+    same = res["full"][2] == res["tiles"][2]
+    print("  identical output : %s" % same)
+    check(same, "tiles : tiled output differs from generate()")
+
+
+def bench_parallel(args):
+    """render_texture_parallel() : processes 1, 2, cpu count. Same output?"""
+    params = {"imgsize": args.size, "cntmax": args.cntmax, "seed": args.seed,
+              "rivet_type": "Circle", "rect_seed": True}
+    t0, (surf0, _) = timeit(lambda: scifitex.render_texture(params), 1)
+    ref = surface_bytes(surf0)
+    print("parallel : %dx%d, tile 512" % (args.size, args.size))
+    print("  render_texture       : %.3f sec" % t0)
+    for n in sorted(set([1, 2, multiprocessing.cpu_count()])):
+        t, (surf, _) = timeit(lambda: scifitex.render_texture_parallel(params, 512, n), 1)
+        same = surface_bytes(surf) == ref
+        print("  %2d processes         : %.3f sec, identical %s" % (n, t, same))
+        check(same, "parallel : %d processes output differs" % n)
+
+
+def bench_threads(args):
+    """Concurrent renders in threads : shared random module vs own random.Random.
+
+    Every render must equal its serial render with random.Random.
+    Odd threads use a fixed fill color, so they share RIVET_STAMPS.
+    """
+    nthreads = 8
+    size = min([args.size, 1024])
+    plist = [{"imgsize": size, "cntmax": args.cntmax, "seed": args.seed + i,
+              "rivet_type": "Circle", "colrandomize": i % 2 == 0, "fillcol": 96}
+             for i in range(nthreads)]
+    refs = [surface_bytes(scifitex.render_texture(p)[0]) for p in plist]
+
+    def render_shared(p):
+        # old way : everything on the global random module
+        w, h, rects, gen_args, _ = scifitex.get_texture_layout(p, None, random)
+        return SciFiTex.generate(w, h, rects, *gen_args, rng=random)
+
+    def render_own(p):
+        return scifitex.render_texture(p)[0]
+
+    def run(func):
+        bad = [0]
+        lock = threading.Lock()
+
+        def worker(i):
+            for j in range(args.repeat):
+                try:
+                    surf = func(plist[i])
+                    same = surface_bytes(surf) == refs[i]
+                    surf.finish()
+                except Exception as e:
+                    print("  thread %d : %s" % (i, e))
+                    same = False
+                if not same:
+                    with lock:
+                        bad[0] += 1
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(nthreads)]
+        t = time.time()
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        return time.time() - t, bad[0]
+
+    print("threads : %dx%d, cntmax=%d, %d threads x %d renders"
+          % (size, size, args.cntmax, nthreads, args.repeat))
+    for name, func in [["random module", render_shared], ["random.Random", render_own]]:
+        t, bad = run(func)
+        print("  %-14s : %.3f sec, %d / %d renders differ from serial"
+              % (name, t, bad, nthreads * args.repeat))
+        if func is render_own:
+            check(bad == 0, "threads : %d threaded renders differ from serial" % bad)
+
+
+CASES = [
+    ["divide", bench_divide],
+    ["scratch", bench_scratch],
+    ["rivet", bench_rivet],
+    ["lines", bench_lines],
+    ["stamps", bench_stamps],
+    ["rgba", bench_rgba],
+    ["pil", bench_pil],
+    ["png", bench_png],
+    ["raw", bench_raw],
+    ["makeup", bench_makeup],
+    ["maps", bench_maps],
+    ["atlas", bench_atlas],
+    ["gray", bench_gray],
+    ["height", bench_height],
+    ["tiles", bench_tiles],
+    ["parallel", bench_parallel],
+    ["threads", bench_threads],
+]
+
+
+def main():
+    names = [c[0] for c in CASES]
+    parser = argparse.ArgumentParser(description="scifitex benchmarks")
+    parser.add_argument("case", nargs="*", help="|".join(names))
+    parser.add_argument("--size", type=int, default=2048)
+    parser.add_argument("--cntmax", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    for name in args.case:
+        if name not in names:
+            parser.error("unknown case : %s" % name)
+
+    print("Python %s, pycairo %s" % (sys.version.split()[0], cairo.version))
+    for name, func in CASES:
+        if len(args.case) == 0 or name in args.case:
+            func(args)
+    if len(FAILED) > 0:
+        sys.exit("%d check(s) failed" % len(FAILED))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+#!python
+# -*- mode: python; Encoding: utf-8; coding: utf-8 -*-
+"""
+Sci-Fi texture generator, headless batch mode.
+
+Render many textures with a multiprocessing worker pool
+and write png files to an output directory. No tkinter.
+
+usage:
+    python scifi_texture_batch.py --seeds 1 2 3 -o out
+    python scifi_texture_batch.py --seed-range 0 1000 -j 8 -o out
+    python scifi_texture_batch.py --params params.json -o out
+    python scifi_texture_batch.py --seeds 1 --imgsize 16384 --tile 1024 -o out
+    python scifi_texture_batch.py --seeds 1 --imgsize 8192 --split-tile 512 -o out
+    python scifi_texture_batch.py --seeds 1 2 3 --makeup -o out
+    python scifi_texture_batch.py --seeds 1 2 3 --maps -o out
+    python scifi_texture_batch.py --seed-range 0 100 --cache cache_dir -o out
+    python scifi_texture_batch.py --seed-range 0 64 --atlas 8 -o out
+    python scifi_texture_batch.py --seeds 1 --imgsize 8192 --gray -o out
+    python scifi_texture_batch.py --seeds 1 2 3 --height png16 --maps -o out
+    python scifi_texture_batch.py --seeds 1 --imgsize 32768 --raw -o out
+
+params.json is a list of parameter dicts. Missing keys are taken
+from the command line options / scifitex.DEFAULT_PARAMS.
+
+Author: mieki256
+License: CC0 / Public Domain
+require: Python, pycairo (NumPy, Pillow for --makeup, --maps)
+
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+
+import scifitex
+from scifitex import SciFiTex, DEFAULT_PARAMS, get_params, render_texture
+from scifitex import render_texture_tiles, render_texture_parallel, render_texture_gray
+
+
+def save_makeup(surface, path):
+    """Save colored (makeup) image of surface as NAME_makeup.png."""
+    from scifitex_makeup import makeup_pil_image
+
+    makeup_pil_image(surface).save(os.path.splitext(path)[0] + "_makeup.png")
+
+
+def save_post(surface, path, params):
+    """Save --makeup / --maps images of a rendered surface."""
+    if params["makeup"]:
+        save_makeup(surface, path)
+    if params["maps"]:
+        from scifitex_maps import get_surface_maps, save_maps
+
+        save_maps(get_surface_maps(surface), path)
+
+
+def get_cache(cache):
+    """Get RenderCache from (directory, max bytes). None : no cache."""
+    if cache is None:
+        return None
+    from scifitex_cache import RenderCache
+
+    return RenderCache(cache[0], cache[1])
+
+
+def render_job(job):
+    """Render one texture and save png. Called in worker process.
+
+    If tile > 0, render tile by tile and save each tile as
+    NAME_XXXXX_YYYYY.png (x, y : tile position in pixels).
+    If params["gray"], save an 8-bit grayscale png.
+    If params["height"], save float heights ("png16" or "npy").
+    If params["raw"], render into a memory-mapped NAME.raw file.
+    cache : (directory, max bytes) of RenderCache or None.
+    """
+    index, params, path, tile, cache = job
+    stamps = scifitex.RIVET_STAMPS
+    hits, misses = stamps.hits, stamps.misses
+    layout = {}
+    cache_hit = False
+    if tile > 0:
+        base = os.path.splitext(path)[0]
+        seed, tiles = render_texture_tiles(params, tile, layout)
+        for x, y, surface in tiles:
+            surface.write_to_png("%s_%05d_%05d.png" % (base, x, y))
+            surface.finish()
+    elif params["raw"]:
+        from scifitex_raw import render_texture_raw
+
+        path = os.path.splitext(path)[0] + ".raw"
+        raw, seed = render_texture_raw(params, path, layout)
+        save_post(raw.surface, path, params)
+        raw.close()
+    elif params["height"] == "png16" and not params["maps"]:
+        from scifitex_png import write_height_png16
+
+        seed = write_height_png16(params, path, stats=layout)
+    elif params["height"]:
+        from scifitex_height import render_texture_height, save_height
+
+        height, seed = render_texture_height(params, 512, layout)
+        path = save_height(height, path, params["height"])
+        if params["maps"]:
+            from scifitex_maps import get_maps, save_maps
+
+            save_maps(get_maps(height), path)
+    elif params["gray"] and not (params["makeup"] or params["maps"]):
+        from scifitex_png import write_texture_png
+
+        # write row bands as they are rendered
+        seed = write_texture_png(params, path, stats=layout)
+    elif params["gray"]:
+        surface, seed = render_texture_gray(params, 512, layout)
+        surface.write_to_png(path)
+        save_post(surface, path, params)
+        surface.finish()
+    else:
+        rcache = get_cache(cache)
+        if rcache is not None:
+            surface, seed, cache_hit = rcache.render(params, layout)
+        else:
+            surface, seed = render_texture(params, layout)
+        surface.write_to_png(path)
+        save_post(surface, path, params)
+        surface.finish()
+    return (index, seed, path, stamps.hits - hits, stamps.misses - misses,
+            layout.get("rects", 0), layout.get("culled", 0), cache_hit)
+
+
+def make_jobs(param_list, outdir, prefix, tile=0, cache=None):
+    """Make job list. One job per parameter set."""
+    jobs = []
+    for i, params in enumerate(param_list):
+        fn = "%s_%04d_%d.png" % (prefix, i, int(params["seed"]))
+        jobs.append((i, params, os.path.join(outdir, fn), tile, cache))
+    return jobs
+
+
+def run_split_jobs(jobs, processes, split_tile, verbose=True):
+    """Run jobs one by one, each image split into tiles over processes.
+
+    Return (elapsed time (sec), stats dict).
+    """
+    stats = {"stamp_hits": 0, "stamp_misses": 0, "rects": 0, "culled": 0,
+             "cache_hits": 0}
+    start = time.time()
+    for i, (index, params, path, _, cache) in enumerate(jobs):
+        layout = {}
+        rcache = get_cache(cache)
+        surface = None
+        if rcache is not None and not params["randomize"]:
+            # same image as render_texture() with rect_seed
+            surface = rcache.get(rcache.get_key(dict(params, rect_seed=True)))
+        if surface is not None:
+            seed = params["seed"]
+            stats["cache_hits"] += 1
+        else:
+            surface, seed = render_texture_parallel(params, split_tile, processes, layout)
+            if rcache is not None and not params["randomize"]:
+                rcache.put(rcache.get_key(dict(params, rect_seed=True), seed), surface)
+        surface.write_to_png(path)
+        save_post(surface, path, params)
+        surface.finish()
+        stats["rects"] += layout.get("rects", 0)
+        stats["culled"] += layout.get("culled", 0)
+        if verbose:
+            print("[%d/%d] seed = %d : %s" % (i + 1, len(jobs), seed, path))
+    return time.time() - start, stats
+
+
+def run_jobs(jobs, processes, verbose=True):
+    """Run jobs. Return (elapsed time (sec), stats dict)."""
+    stats = {"stamp_hits": 0, "stamp_misses": 0, "rects": 0, "culled": 0,
+             "cache_hits": 0}
+    start = time.time()
+    if processes == 1:
+        results = map(render_job, jobs)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap_unordered(render_job, jobs)
+
+    try:
+        for i, res in enumerate(results):
+            index, seed, path, hits, misses, rects, culled, cache_hit = res
+            stats["stamp_hits"] += hits
+            stats["stamp_misses"] += misses
+            stats["rects"] += rects
+            stats["culled"] += culled
+            if cache_hit:
+                stats["cache_hits"] += 1
+            if verbose:
+                print("[%d/%d] seed = %d : %s" % (i + 1, len(jobs), seed, path))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return time.time() - start, stats
+
+
+def run_atlas(param_list, outdir, prefix, cols, padding, processes, verbose=True):
+    """Render all parameter sets into one atlas png + json manifest.
+
+    Return (elapsed time (sec), stats dict).
+    """
+    from scifitex_atlas import render_atlas, save_atlas
+
+    stats = {"stamp_hits": 0, "stamp_misses": 0, "rects": 0, "culled": 0,
+             "cache_hits": 0}
+    start = time.time()
+    surface, manifest = render_atlas(param_list, cols, padding, processes, stats)
+    path = os.path.join(outdir, "%s_atlas.png" % prefix)
+    fn = save_atlas(surface, manifest, path)
+    # main() checked that makeup / maps are the same for all cells
+    save_post(surface, path, param_list[0])
+    surface.finish()
+    if verbose:
+        print("%d cells (%d x %d), %d x %d : %s, %s"
+              % (len(param_list), manifest["cols"], manifest["rows"],
+                 manifest["width"], manifest["height"], path, fn))
+    return time.time() - start, stats
+
+
+def get_base_params(args):
+    """Get base parameter dict from command line options."""
+    params = get_params()
+    for k in DEFAULT_PARAMS.keys():
+        v = getattr(args, k, None)
+        if v is not None:
+            params[k] = v
+    params["randomize"] = False
+    return params
+
+
+def get_param_list(args):
+    """Get parameter dict list from --seeds, --seed-range, --params."""
+    base = get_base_params(args)
+    param_list = []
+
+    if args.params:
+        with open(args.params) as f:
+            lst = json.load(f)
+        for d in lst:
+            p = dict(base)
+            p.update(d)
+            param_list.append(p)
+
+    seeds = list(args.seeds or [])
+    if args.seed_range:
+        start, count = args.seed_range
+        seeds.extend(range(start, start + count))
+
+    for seed in seeds:
+        p = dict(base)
+        p["seed"] = seed
+        param_list.append(p)
+
+    if len(param_list) == 0:
+        param_list.append(base)
+
+    return param_list
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Sci-Fi texture generator (batch)")
+    parser.add_argument("-o", "--outdir", default="output", help="output directory")
+    parser.add_argument("--prefix", default="scifi", help="output file name prefix")
+    parser.add_argument("-j", "--processes", type=int, default=0,
+                        help="number of worker processes (0: cpu count)")
+    parser.add_argument("-q", "--quiet", action="store_true")
+    parser.add_argument("--seeds", type=int, nargs="+", metavar="SEED")
+    parser.add_argument("--seed-range", type=int, nargs=2, metavar=("START", "COUNT"))
+    parser.add_argument("--params", metavar="JSON", help="parameter list json file")
+    parser.add_argument("--tile", type=int, default=0, metavar="SIZE",
+                        help="render and save SIZE x SIZE tiles (bounded memory)")
+    parser.add_argument("--split-tile", type=int, default=0, metavar="SIZE",
+                        help="render each image as SIZE x SIZE tiles on all processes"
+                        " and save one png")
+    parser.add_argument("--cache", metavar="DIR",
+                        help="render cache directory. reuse images rendered before")
+    parser.add_argument("--cache-size", type=int, default=1024, metavar="MB",
+                        help="render cache size limit (default: 1024 MB)")
+    parser.add_argument("--atlas", type=int, metavar="COLS",
+                        help="render all images into one atlas png with COLS columns"
+                        " (0: square) and a json manifest of the cells")
+    parser.add_argument("--atlas-padding", type=int, default=0, metavar="PX",
+                        help="space between atlas cells")
+
+    grp = parser.add_argument_group("texture parameters")
+    grp.add_argument("--imgsize", type=int)
+    grp.add_argument("--dmin", type=int)
+    grp.add_argument("--dmax", type=int)
+    grp.add_argument("--cntmax", type=int)
+    grp.add_argument("--spc", type=int)
+    grp.add_argument("--borderradius", type=int)
+    grp.add_argument("--no-rivet", dest="rivet_enable", action="store_false", default=None)
+    grp.add_argument("--rivet-type", dest="rivet_type", choices=SciFiTex.RIVET_KIND)
+    grp.add_argument("--rivet-bg", dest="rivet_bg", action="store_true", default=None)
+    grp.add_argument("--rivet-spc", dest="rivet_spc", type=int)
+    grp.add_argument("--rivet-size", dest="rivet_size", type=int)
+    grp.add_argument("--rivet-h", dest="rivet_h", type=int)
+    grp.add_argument("--fillcol", type=int,
+                     help="fill color (0-160). disable fill color randomize")
+    grp.add_argument("--bordercol", type=int)
+    grp.add_argument("--drawtype", choices=SciFiTex.PAT_KIND)
+    grp.add_argument("--rect-seed", dest="rect_seed", action="store_true", default=None,
+                     help="seed each rect (same result as --tile)")
+    grp.add_argument("--cull", action="store_true", default=None,
+                     help="drop rects too small to draw while dividing"
+                     " (faster with deep --cntmax, different layout)")
+    grp.add_argument("--makeup", action="store_true", default=None,
+                     help="also save a colored NAME_makeup.png (needs NumPy)")
+    grp.add_argument("--gray", action="store_true", default=None,
+                     help="render to an 8-bit gray surface and save grayscale png"
+                     " (1/4 memory, same result as --rect-seed)")
+    grp.add_argument("--height", choices=["png16", "npy"],
+                     help="high precision render (cairo FORMAT_RGBA128F). save 16-bit"
+                     " grayscale png or float32 NAME.npy (same layout as --rect-seed)")
+    grp.add_argument("--raw", action="store_true", default=None,
+                     help="render into a memory-mapped NAME.raw file instead of png"
+                     " (see scifitex_raw.py)")
+    grp.add_argument("--maps", action="store_true", default=None,
+                     help="also save NAME_normal.png, NAME_ao.png, NAME_roughness.png"
+                     " (needs NumPy)")
+    return parser
+
+
+def main():
+    """Main."""
+    parser = get_parser()
+    args = parser.parse_args()
+    if (args.makeup or args.maps) and args.tile > 0:
+        parser.error("--makeup, --maps can not be used with --tile")
+    if args.cache and args.tile > 0:
+        parser.error("--cache can not be used with --tile")
+    if args.atlas is not None and (args.tile > 0 or args.split_tile > 0 or args.cache):
+        parser.error("--tile, --split-tile, --cache can not be used with --atlas")
+    if args.gray and (args.tile > 0 or args.split_tile > 0 or args.cache
+                      or args.atlas is not None):
+        parser.error("--tile, --split-tile, --cache, --atlas can not be used with --gray")
+    if args.height and (args.tile > 0 or args.split_tile > 0 or args.cache
+                        or args.atlas is not None or args.gray or args.makeup):
+        parser.error("--tile, --split-tile, --cache, --atlas, --gray, --makeup"
+                     " can not be used with --height")
+    if args.height:
+        from scifitex_height import has_float_format
+        if not has_float_format():
+            parser.error("--height needs cairo 1.17.2 or later (FORMAT_RGBA128F)")
+    if args.raw and (args.tile > 0 or args.split_tile > 0 or args.cache
+                     or args.atlas is not None or args.gray or args.height):
+        parser.error("--tile, --split-tile, --cache, --atlas, --gray, --height"
+                     " can not be used with --raw")
+    if args.raw and sys.version_info[0] < 3:
+        parser.error("--raw needs Python 3")
+    if args.fillcol is not None:
+        args.colrandomize = False
+
+    param_list = get_param_list(args)
+    if args.atlas is not None:
+        # --makeup / --maps are applied to the whole atlas image
+        for k in ["makeup", "maps"]:
+            if len(set([bool(p[k]) for p in param_list])) > 1:
+                parser.error("--atlas : \"%s\" must be the same for all cells" % k)
+    if not os.path.isdir(args.outdir):
+        os.makedirs(args.outdir)
+
+    processes = args.processes if args.processes > 0 else multiprocessing.cpu_count()
+
+    cache = None
+    if args.cache:
+        cache = (args.cache, args.cache_size * 1024 * 1024)
+    jobs = make_jobs(param_list, args.outdir, args.prefix, args.tile, cache)
+    if args.atlas is not None:
+        t, stats = run_atlas(param_list, args.outdir, args.prefix, args.atlas,
+                             args.atlas_padding, processes, not args.quiet)
+    elif args.split_tile > 0:
+        t, stats = run_split_jobs(jobs, processes, args.split_tile, not args.quiet)
+    else:
+        processes = min(processes, len(param_list))
+        t, stats = run_jobs(jobs, processes, not args.quiet)
+
+    n = len(jobs)
+    print("%d images, %d processes, %.3f sec, %.2f images/sec"
+          % (n, processes, t, (n / t) if t > 0 else 0.0))
+
+    if cache is not None:
+        print("render cache : %d hits" % stats["cache_hits"])
+
+    if stats["culled"] > 0:
+        print("rects : %d kept, %d culled" % (stats["rects"], stats["culled"]))
+
+    hits, misses = stats["stamp_hits"], stats["stamp_misses"]
+    if hits + misses > 0:
+        print("rivet stamps : %d hits, %d misses (%.1f%% reuse)"
+              % (hits, misses, 100.0 * hits / (hits + misses)))
+
+
+if __name__ == "__main__":
+    main()
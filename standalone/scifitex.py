@@ -0,0 +1,1573 @@
+#!python
+# -*- mode: python; Encoding: utf-8; coding: utf-8 -*-
+"""
+Sci-Fi texture generator core (DividedRect, SciFiTex).
+
+No tkinter / Pillow dependency, so it can be imported from
+headless tools and worker processes.
+
+Author: mieki256
+License: CC0 / Public Domain
+require: Python, pycairo
+
+"""
+
+import sys
+import multiprocessing
+import cairo
+import math
+import random
+import time
+import threading
+from collections import OrderedDict
+from array import array
+
+
+class RectArray(object):
+    """Rectangle list in a flat array('i') : x0, y0, x1, y1, x0, ...
+
+    Indexing and iteration give (x0, y0, x1, y1) tuples, so it can be
+    used where a list of rects is expected.
+    """
+
+    def __init__(self, data=None):
+        self.data = data if data is not None else array("i")
+
+    def __len__(self):
+        return len(self.data) // 4
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        j = i * 4
+        return tuple(self.data[j:j + 4])
+
+    def __iter__(self):
+        it = iter(self.data)
+        return zip(it, it, it, it)
+
+
+class DividedRect:
+
+    @staticmethod
+    def get_div_positions(a0, a1, d, sftv, rng=None):
+        """Get sorted unique cut positions a0, ..., a1 for d divisions."""
+        if rng is None:
+            rng = random
+        step = float(a1 - a0) / d
+        s = step * sftv / 2.0
+        lst = [a0]
+        i = 1
+        while i < d:
+            a = math.floor(a0 + step * i + rng.uniform(-s, s))
+            if a <= a1:
+                lst.append(a)
+            i += 1
+        lst.append(a1)
+
+        # positions only go backwards with sftv > 1
+        prev = lst[0]
+        for a in lst:
+            if a < prev:
+                return sorted(set(lst))
+            prev = a
+
+        res = [lst[0]]
+        for a in lst:
+            if a != res[-1]:
+                res.append(a)
+        return res
+
+    @staticmethod
+    def get_div_rects(x0, y0, x1, y1, d, v, sftv, rng=None):
+        new_rect = []
+        x0 = math.floor(x0)
+        y0 = math.floor(y0)
+        x1 = math.floor(x1)
+        y1 = math.floor(y1)
+        w0 = x1 - x0
+        h0 = y1 - y0
+        if w0 <= 0 or h0 <= 0:
+            return new_rect
+
+        ydivide = True if w0 <= h0 else False
+        if v == 0:
+            ydivide = False
+        elif v == 1:
+            ydivide = True
+
+        if ydivide:
+            lst = DividedRect.get_div_positions(y0, y1, d, sftv, rng)
+            for i in range(len(lst) - 1):
+                new_rect.append([int(x0), int(lst[i]), int(x1), int(lst[i + 1])])
+        else:
+            lst = DividedRect.get_div_positions(x0, x1, d, sftv, rng)
+            for i in range(len(lst) - 1):
+                new_rect.append([int(lst[i]), int(y0), int(lst[i + 1]), int(y1)])
+        return new_rect
+
+    @staticmethod
+    def div_rect(rects, x0, y0, x1, y1, v, cnt, cntmax, dmin, dmax, rng=None):
+        """Divide rectangle recursively. (reference for divide())"""
+        if rng is None:
+            rng = random
+        if cnt > cntmax:
+            return rects
+
+        if dmin >= dmax:
+            d = dmin
+        elif cnt == 0:
+            d = dmax
+        else:
+            d = rng.randint(dmin, dmax)
+
+        new_rects = DividedRect.get_div_rects(x0, y0, x1, y1, d, v, 0.6, rng)
+
+        if cnt == cntmax:
+            rects.extend(new_rects)
+        else:
+            for r in new_rects:
+                x0, y0, x1, y1 = r
+                rects = DividedRect.div_rect(rects, x0, y0, x1, y1,
+                                             2, cnt + 1, cntmax, dmin, dmax, rng)
+        return rects
+
+    @staticmethod
+    def divide(w, h, dmin, dmax, cntmax, max_rects=0, min_size=0, stats=None, rng=None):
+        """Divide rectangle without recursion. Return RectArray.
+
+        Depth-first with an explicit stack, so random is used in the
+        same order as div_rect() and a seed gives the same layout.
+
+        max_rects : if > 0, a rect is not divided when that would make
+                    more than max_rects rects. (the layout changes)
+        min_size : if > 0, rects with width or height <= min_size are
+                   dropped with everything inside them. (the layout changes)
+        stats : dict, set "rects", "culled", "budget_stops".
+        rng : random.Random instance (default: the random module).
+        """
+        if rng is None:
+            rng = random
+        if dmin > dmax:
+            dmax = dmin
+
+        out = array("i")
+        culled = 0
+        budget_stops = 0
+        rnd_d = dmin < dmax
+        sftv = 0.6
+
+        # x0, y0, x1, y1, v, cnt
+        stack = [(0, 0, w - 1, h - 1, 1, 0)]
+        while stack:
+            x0, y0, x1, y1, v, cnt = stack.pop()
+            if not rnd_d:
+                d = dmin
+            elif cnt == 0:
+                d = dmax
+            else:
+                d = rng.randint(dmin, dmax)
+
+            if x1 - x0 <= 0 or y1 - y0 <= 0:
+                continue
+
+            ydivide = True if x1 - x0 <= y1 - y0 else False
+            if v == 0:
+                ydivide = False
+            elif v == 1:
+                ydivide = True
+
+            if ydivide:
+                lst = DividedRect.get_div_positions(y0, y1, d, sftv, rng)
+                children = [(x0, lst[i], x1, lst[i + 1]) for i in range(len(lst) - 1)]
+            else:
+                lst = DividedRect.get_div_positions(x0, x1, d, sftv, rng)
+                children = [(lst[i], y0, lst[i + 1], y1) for i in range(len(lst) - 1)]
+
+            if min_size > 0:
+                n = len(children)
+                children = [r for r in children
+                            if r[2] - r[0] > min_size and r[3] - r[1] > min_size]
+                culled += n - len(children)
+
+            if max_rects > 0 and len(out) // 4 + len(stack) + len(children) > max_rects:
+                # over budget : keep this rect undivided
+                budget_stops += 1
+                out.extend([int(x0), int(y0), int(x1), int(y1)])
+                continue
+
+            if cnt == cntmax:
+                for r in children:
+                    out.extend([int(r[0]), int(r[1]), int(r[2]), int(r[3])])
+            else:
+                for r in reversed(children):
+                    stack.append((r[0], r[1], r[2], r[3], 2, cnt + 1))
+
+        if stats is not None:
+            stats["rects"] = len(out) // 4
+            stats["culled"] = culled
+            stats["budget_stops"] = budget_stops
+        return RectArray(out)
+
+    @staticmethod
+    def get_divide_rectangles(w, h, dmin, dmax, cntmax, rng=None):
+        """Divide rectangle."""
+        return [list(r) for r in DividedRect.divide(w, h, dmin, dmax, cntmax, rng=rng)]
+
+    @staticmethod
+    def init_random_seed(seed, randomize, rng=None):
+        """Seed rng (default: the random module). Return the seed."""
+        if randomize or randomize == 1:
+            # seed = math.floor(time.time())
+            seed = int(time.time() * 100)
+        if rng is None:
+            rng = random
+        rng.seed(seed)
+        return seed
+
+    @staticmethod
+    def get_rect_seed(seed, index):
+        """Get random seed of rects[index] for image seed."""
+        return seed * 0x100000000 + index
+
+
+class SurfacePool:
+    """Reusable scratch surface for the SciFiTex pattern drawers.
+
+    One ARGB32 surface grows to the largest requested size and only the
+    requested area is cleared between uses. generate() composites just
+    that area (clipped to the rectangle), so the output is the same as
+    with a new surface for every pattern.
+
+    set_view() limits the surface to a part of the pattern area
+    (generate() with window), so the scratch size is bounded by the
+    window size, not by the rectangle size.
+
+    scale : pixels per pattern unit (generate() with scale). The
+    surface area is scaled and the context is scaled to match.
+    format : surface format (generate() with fmt).
+    """
+
+    def __init__(self):
+        self.surface = None
+        self.width = 0
+        self.height = 0
+        self.allocs = 0
+        self.requests = 0
+        self.view = None
+        self.scale = 1.0
+        self.format = cairo.FORMAT_ARGB32
+
+    def set_view(self, x, y, w, h):
+        """Set visible part (x, y, w, h) of the next pattern area."""
+        self.view = (x, y, w, h)
+
+    def get_origin(self):
+        """Get pattern area position of the surface (0, 0)."""
+        if self.view is None:
+            return 0, 0
+        return self.view[0], self.view[1]
+
+    def get(self, w, h):
+        """Return (surface, context) with a cleared w x h area.
+
+        If set_view() was called, the area is the view size and the
+        context is translated so pattern coordinates stay the same.
+        """
+        self.requests += 1
+        vx, vy = self.get_origin()
+        if self.view is not None:
+            w, h = self.view[2], self.view[3]
+        if self.scale != 1.0:
+            w = int(math.ceil(w * self.scale))
+            h = int(math.ceil(h * self.scale))
+
+        if self.surface is not None and self.surface.get_format() != self.format:
+            self.finish()
+        if self.surface is None or w > self.width or h > self.height:
+            self.finish()
+            self.width = max([w, self.width])
+            self.height = max([h, self.height])
+            self.surface = cairo.ImageSurface(self.format, self.width, self.height)
+            self.allocs += 1
+            ctx = cairo.Context(self.surface)
+        else:
+            ctx = cairo.Context(self.surface)
+            ctx.set_operator(cairo.OPERATOR_CLEAR)
+            ctx.rectangle(0, 0, w, h)
+            ctx.fill()
+            ctx.set_operator(cairo.OPERATOR_OVER)
+
+        if self.scale != 1.0:
+            ctx.scale(self.scale, self.scale)
+        if vx != 0 or vy != 0:
+            ctx.translate(-vx, -vy)
+        return self.surface, ctx
+
+    def finish(self):
+        if self.surface is not None:
+            self.surface.finish()
+            self.surface = None
+
+
+class RivetStampCache:
+    """LRU cache of pre-rendered circle rivet stamps.
+
+    Key is (rivet size, rivet height, background gray, rivet bg enable).
+    The background gray is the exact fill color, so a stamp is the same
+    as drawing the rivet. Only shared when the fill color is fixed.
+    hits / misses count lookups.
+    get() is thread safe. Evicted stamps are not finished, a thread
+    may still be painting one (they are freed with the last reference).
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.stamps = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, bgcol, rivetsize, rivet_h, bg_enable):
+        """Return (stamp surface, center offset)."""
+        key = (rivetsize, rivet_h, bgcol, bool(bg_enable))
+        with self.lock:
+            v = self.stamps.pop(key, None)
+            if v is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                v = self.render(bgcol, rivetsize, rivet_h, bg_enable)
+                if len(self.stamps) >= self.maxsize:
+                    self.stamps.popitem(last=False)
+            self.stamps[key] = v
+        return v
+
+    @staticmethod
+    def render(bgcol, rivetsize, rivet_h, bg_enable):
+        """Render one rivet (same shape as SciFiTex.draw_rivet)."""
+        height_max = (rivet_h / 256.0)
+        rr = rivetsize / 2.0
+        c = int(math.ceil(rr + 3.0 if bg_enable else rr)) + 1
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, c * 2, c * 2)
+        ctx = cairo.Context(surface)
+        ctx.set_line_width(0)
+
+        if bg_enable:
+            # fill rivet background
+            ctx.set_source_rgba(bgcol, bgcol, bgcol)
+            ctx.arc(c, c, rr + 3.0, 0, 2 * math.pi)
+            ctx.fill()
+
+            bgcol = max([0.0, (bgcol - height_max)])
+            ctx.set_source_rgba(bgcol, bgcol, bgcol)
+            ctx.arc(c, c, rr + 1.0, 0, 2 * math.pi)
+            ctx.fill()
+
+        SciFiTex.fill_rivets(ctx, [[c, c]], rr, bgcol, height_max)
+
+        return surface, c
+
+    def clear(self):
+        """Drop all stamps. Not while other threads are rendering."""
+        with self.lock:
+            for surface, _ in self.stamps.values():
+                surface.finish()
+            self.stamps.clear()
+
+    def get_hit_rate(self):
+        n = self.hits + self.misses
+        return (float(self.hits) / n) if n > 0 else 0.0
+
+
+# shared by all generate() calls in this process
+RIVET_STAMPS = RivetStampCache()
+
+
+class SciFiTex:
+
+    PAT_KIND = [
+        "All",  # 0
+        "Rect only",  # 1
+        "Lines",  # 2
+        "Box",  # 3
+        "Box fill",  # 4
+        "Box fill b",  # 5
+        "Grid",  # 6
+        "Angle line a",  # 7
+        "Angle line b",  # 8
+        "Angle line c"  # 9
+    ]
+
+    RIVET_KIND = [
+        "Box",
+        "Circle"
+    ]
+
+    # circle rivet rings with a bigger gray step (1/255) to the next
+    # ring are filled one by one, the rest with one radial gradient
+    RIVET_GRADIENT_STEP = 3
+
+    @staticmethod
+    def new_surface(w, h, pool=None):
+        """Get pattern surface and context. Use pool if not None."""
+        if pool is not None:
+            return pool.get(w, h)
+        ims = cairo.ImageSurface(cairo.FORMAT_ARGB32, w, h)
+        return ims, cairo.Context(ims)
+
+    @staticmethod
+    def paint_surface(ctx, surface, x, y, scale=1.0):
+        """Paint pattern surface at (x, y). surface has scale pixels per unit.
+
+        With scale, the surface is painted 1:1 at the nearest whole
+        device pixel, so it is not resampled.
+        """
+        if scale != 1.0:
+            dx, dy = ctx.user_to_device(x, y)
+            ctx.identity_matrix()
+            x, y = math.floor(dx + 0.5), math.floor(dy + 0.5)
+        ctx.set_source_surface(surface, x, y)
+        ctx.paint()
+
+    @staticmethod
+    def draw_rounder_rectangle(ctx, x, y, w, h, ra):
+        """Set sub path rounded rectangle."""
+        deg = math.pi / 180.0
+        ctx.new_sub_path()
+        ctx.arc(x + w - ra, y + ra, ra, -90 * deg, 0 * deg)
+        ctx.arc(x + w - ra, y + h - ra, ra, 0 * deg, 90 * deg)
+        ctx.arc(x + ra, y + h - ra, ra, 90 * deg, 180 * deg)
+        ctx.arc(x + ra, y + ra, ra, 180 * deg, 270 * deg)
+        ctx.close_path()
+
+    @staticmethod
+    def set_rounder_rectangle(ctx, x0, y0, x1, y1, borderradius=0):
+        """Set rouder rectangle path."""
+        w, h = x1 - x0, y1 - y0
+        r = borderradius
+        d = r * 2
+        if d > w or d > h:
+            r = math.floor(float(min([w, h])) / 2.0)
+
+        if r <= 0:
+            ctx.rectangle(x0, y0, w, h)
+        else:
+            SciFiTex.draw_rounder_rectangle(ctx, x0, y0, w, h, r)
+
+    @staticmethod
+    def draw_rect(ctx, x0, y0, x1, y1, fillcol=None, linecol=None,
+                  linewidth=None, borderradius=0):
+        """Draw rectangle."""
+        # w, h = x1 - x0, y1 - y0
+        ctx.set_line_join(cairo.LINE_JOIN_ROUND)
+        ctx.set_line_cap(cairo.LINE_CAP_ROUND)
+        ctx.set_line_width(linewidth if linewidth is not None else 0)
+
+        if fillcol is not None:
+            ctx.set_source_rgba(fillcol, fillcol, fillcol, 1.0)
+
+        if fillcol is not None or linecol is not None:
+            SciFiTex.set_rounder_rectangle(ctx, x0, y0, x1, y1, borderradius)
+
+        if fillcol is not None:
+            if linecol is None:
+                ctx.fill()
+                return
+            else:
+                ctx.fill_preserve()
+
+        if linecol is not None:
+            ctx.set_source_rgba(linecol, linecol, linecol, 1.0)
+            ctx.stroke()
+
+    @staticmethod
+    def stroke_lines(ctx, data, batch=True):
+        """Stroke lines [[x0, y0, x1, y1, width, col], ...] in order.
+
+        batch : stroke consecutive lines of same width and color as one
+        path. Same output if the lines of a group do not overlap.
+        """
+        last = None
+        for x0, y0, x1, y1, brushsize, col in data:
+            if not batch or (brushsize, col) != last:
+                if last is not None:
+                    ctx.stroke()
+                last = (brushsize, col)
+                ctx.set_line_width(brushsize)
+                ctx.set_source_rgba(col, col, col)
+            ctx.move_to(x0, y0)
+            ctx.line_to(x1, y1)
+        if last is not None:
+            ctx.stroke()
+
+    @staticmethod
+    def draw_lines(area, spacing, linecol, linespc, horizontal, count, area_chk, pool=None, rng=None):
+        if rng is None:
+            rng = random
+        _, _, _, _, w, h = area
+        if w < area_chk or h < area_chk:
+            return None
+
+        brushsize = 5
+        if linecol >= 0.5:
+            linespc = linespc * 1.6
+            brushsize = 7
+        dd = 18
+
+        data = []
+        if horizontal == 0:
+            # Vertical line
+            h1 = math.floor(h * rng.uniform(0.3, 0.8))
+            px0 = dd + rng.randint(0, int(w / 3))
+            py0 = rng.randint(0, int((h - h1) + 16)) - 8
+            px1 = w - dd
+            py1 = py0 + (h * 0.4)
+            x = px0
+            for i in range(count):
+                if x >= px1:
+                    break
+                data.append([x, py0, x, py1, brushsize, linecol])
+                x = x + linespc
+        else:
+            # Horizontal Line
+            w1 = math.floor(w * rng.uniform(0.3, 0.8))
+            px0 = rng.randint(0, int((w - w1) + 16)) - 8
+            py0 = dd + rng.randint(0, int(h / 3))
+            px1 = px0 + (w * 0.4)
+            py1 = h - dd
+            y = py0
+            for i in range(count):
+                if y >= py1:
+                    break
+                data.append([px0, y, px1, y, brushsize, linecol])
+                y = y + linespc
+
+        ims, ctx = SciFiTex.new_surface(w, h, pool)
+        ctx.set_line_cap(cairo.LINE_CAP_ROUND)
+        ctx.set_line_join(cairo.LINE_JOIN_MITER)
+        SciFiTex.stroke_lines(ctx, data)
+
+        return ims
+
+    @staticmethod
+    def draw_box(area, spacing, linecol, area_chk, pool=None, rng=None):
+        if rng is None:
+            rng = random
+        _, _, _, _, w, h = area
+        if w < area_chk or h < area_chk:
+            return None
+
+        w1 = math.floor(w * 0.4)
+        h1 = math.floor(h * 0.4)
+        aw = w1 + rng.randint(0, w1)
+        ah = h1 + rng.randint(0, h1)
+        px0 = rng.randint(0, (w - aw) + 16) - 8
+        py0 = rng.randint(0, (h - ah) + 16) - 8
+
+        brushsize = rng.randint(1, 2)
+        # bsize = 1
+
+        ims, ctx = SciFiTex.new_surface(w, h, pool)
+        ctx.set_source_rgba(linecol, linecol, linecol)
+        ctx.set_line_width(brushsize)
+        ctx.set_line_cap(cairo.LINE_CAP_ROUND)
+        ctx.set_line_join(cairo.LINE_JOIN_MITER)
+        ctx.rectangle(px0, py0, aw, ah)
+        ctx.stroke()
+
+        return ims
+
+    @staticmethod
+    def draw_box_fill(area, spacing, bgcol, area_chk, pool=None, rng=None):
+        if rng is None:
+            rng = random
+        x0, y0, x1, y1, sw, sh = area
+        if sw < area_chk or sh < area_chk:
+            return None
+
+        col_add_fg = True if rng.random() <= 0.5 else False
+
+        d = rng.randint(2, 4)
+        rects = DividedRect.get_div_rects(0, 0, x1 - x0, y1 - y0, d, 2, 0.6, rng)
+        data = []
+        for rect in rects:
+            x0, y0, x1, y1 = rect
+            w0 = math.floor(x1 - x0)
+            h0 = math.floor(y1 - y0)
+            aa = 4
+            if w0 <= aa * 2 or h0 <= aa * 2:
+                continue
+
+            aw = w0 - aa * 2
+            ah = h0 - aa * 2
+            if aw <= 10 or ah <= 10:
+                continue
+
+            col = 0.0
+            if col_add_fg:
+                v = bgcol
+                col = bgcol - rng.uniform(bgcol * 0.05, bgcol * 0.3)
+            else:
+                v = 1.0 - bgcol
+                col = bgcol + rng.uniform(v * 0.05, v * 0.3)
+
+            w = math.floor(rng.randint(3, 7) * aw / 10.0)
+            h = math.floor(rng.randint(3, 7) * ah / 10.0)
+            px0 = x0 + aa + rng.randint(0, int(aw - w))
+            py0 = y0 + aa + rng.randint(0, int(ah - h))
+            data.append([px0, py0, w, h, col])
+
+        ims, ctx = SciFiTex.new_surface(sw, sh, pool)
+        ctx.set_line_width(0)
+        ctx.set_line_cap(cairo.LINE_CAP_ROUND)
+        ctx.set_line_join(cairo.LINE_JOIN_MITER)
+        for x, y, w, h, col in data:
+            ctx.set_source_rgba(col, col, col)
+            ctx.rectangle(x, y, w, h)
+            ctx.fill()
+
+        return ims
+
+    @staticmethod
+    def draw_box_fill_b(area, spacing, bg_col, area_chk, pool=None, rng=None):
+        if rng is None:
+            rng = random
+        x0, y0, x1, y1, sw, sh = area
+        if sw < area_chk or sh < area_chk:
+            return None
+
+        aa = 8
+        x0 = math.floor(x0 + aa)
+        y0 = math.floor(y0 + aa)
+        x1 = math.floor(x1 - aa)
+        y1 = math.floor(y1 - aa)
+        w0 = x1 - x0
+        h0 = y1 - y0
+        if w0 <= 0 or h0 <= 0:
+            return None
+
+        col_add_fg = True if rng.random() <= 0.5 else False
+
+        # divide rect
+        d = rng.randint(2, 3)
+        rects = DividedRect.get_div_rects(0, 0, x1 - x0, y1 - y0, d, 2, 0.6, rng)
+        fill_rects = []
+        for rect in rects:
+            x0, y0, x1, y1 = rect
+            w0 = math.floor(x1 - x0)
+            h0 = math.floor(y1 - y0)
+            if w0 <= 0 or h0 <= 0:
+                continue
+
+            d = rng.randint(2, 3)
+            nrects = DividedRect.get_div_rects(x0, y0, x1, y1, d, 2, 0.6, rng)
+            for rect in nrects:
+                x0, y0, x1, y1 = rect
+                aa = 3
+                x0 = math.floor(x0 + aa)
+                y0 = math.floor(y0 + aa)
+                x1 = math.floor(x1 - aa)
+                y1 = math.floor(y1 - aa)
+                w = math.floor(x1 - x0)
+                h = math.floor(y1 - y0)
+                if w <= aa * 2 or h <= aa * 2:
+                    continue
+                fill_rects.append([x0, y0, w, h])
+
+        if len(fill_rects) <= 0:
+            return None
+
+        # colors setting
+        col_cnt = 0
+        cols = []
+        while col_cnt == 0:
+            col_cnt = 0
+            cols = []
+            for i in range(len(fill_rects)):
+                if rng.random() <= 0.6:
+                    cols.append(bg_col)
+                else:
+                    if col_add_fg:
+                        v = bg_col
+                        col = bg_col - rng.uniform(v * 0.1, v * 0.5)
+                    else:
+                        v = 1.0 - bg_col
+                        col = bg_col + rng.uniform(v * 0.1, v * 0.5)
+                    cols.append(col)
+                    col_cnt += 1
+
+        ims, ctx = SciFiTex.new_surface(sw, sh, pool)
+        ctx.set_line_width(0)
+        ctx.set_line_cap(cairo.LINE_CAP_ROUND)
+        ctx.set_line_join(cairo.LINE_JOIN_MITER)
+        for i, rect in enumerate(fill_rects):
+            x, y, w, h = rect
+            col = cols[i]
+            ctx.set_source_rgba(col, col, col)
+            ctx.rectangle(x, y, w, h)
+            ctx.fill()
+
+        return ims
+
+    @staticmethod
+    def draw_grid(area, spacing, fgcol, bgcol, linespc, area_chk, pool=None, rng=None):
+        if rng is None:
+            rng = random
+        x0, y0, x1, y1, sw, sh = area
+        if sw < area_chk or sh < area_chk:
+            return None
+
+        count = rng.randint(3, 6)
+
+        data = []
+        brushsize = 5
+        xd, yd = 12, 8
+        px0, py0 = xd, yd
+        px1, py1 = sw - xd, sh - yd
+        y = py0 + 3.5
+        while y < py1 + 3.5:
+            data.append([px0, y, px1, y, brushsize, fgcol])
+            y = y + linespc
+
+        brushsize = 3
+        px0 = px0 - 3
+        px1 = px1 + 3
+        pw = px1 - px0
+        dd = float(pw) / count
+        x = px0 + dd
+        for i in range(count - 1):
+            data.append([x, 0, x, sh, brushsize, bgcol])
+            x = x + dd
+
+        ims, ctx = SciFiTex.new_surface(sw, sh, pool)
+        ctx.set_line_cap(cairo.LINE_CAP_ROUND)
+        ctx.set_line_join(cairo.LINE_JOIN_MITER)
+        SciFiTex.stroke_lines(ctx, data)
+
+        return ims
+
+    @staticmethod
+    def draw_angled_line(area, spacing, fgcol, area_chk, pool=None, rng=None):
+        if rng is None:
+            rng = random
+        x0, y0, x1, y1, sw, sh = area
+        if sw < area_chk or sh < area_chk:
+            return None
+
+        px0 = -spacing * 2
+        px1 = sw + spacing * 2
+        py0 = -spacing * 2
+        py1 = sh + spacing * 2
+        w = px1 - px0
+        h = py1 - py0
+
+        count = 3
+        aa = 10
+        if w >= h:
+            px1 = math.floor(px0 + rng.randint(2, 6) * w / 10)
+            px0 = math.floor(px0 + rng.randint(2, 6) * w / 10)
+            dx, dy = aa, 0
+        else:
+            py1 = math.floor(py0 + rng.randint(2, 6) * h / 10)
+            py0 = math.floor(py0 + rng.randint(2, 6) * h / 10)
+            dx, dy = 0, aa
+
+        brushsize = 2
+        # brushsize = random.randint(2, 3)
+
+        data = []
+        for i in range(count):
+            data.append([px0, py0, px1, py1])
+            px0 += dx
+            px1 += dx
+            py0 += dy
+            py1 += dy
+
+        ims, ctx = SciFiTex.new_surface(sw, sh, pool)
+        ctx.set_line_cap(cairo.LINE_CAP_ROUND)
+        ctx.set_line_join(cairo.LINE_JOIN_MITER)
+        ctx.set_line_width(brushsize)
+        ctx.set_source_rgba(fgcol, fgcol, fgcol)
+        for x0, y0, x1, y1 in data:
+            ctx.move_to(x0, y0)
+            ctx.line_to(x1, y1)
+            ctx.stroke()
+
+        return ims
+
+    @staticmethod
+    def draw_angled_line_b(area, spacing, fgcol, lw, area_chk, pool=None, rng=None):
+        if rng is None:
+            rng = random
+        x0, y0, x1, y1, sw, sh = area
+        if sw <= area_chk or sh <= area_chk:
+            return None
+
+        ph0 = lw
+        py0 = math.floor(rng.randint(3, 5) * sh / 8)
+        py1 = py0 + ph0
+
+        pw0 = sw * 3 / 12
+        px0 = -spacing * 2
+        px1 = pw0
+        px2 = px1 + ph0
+
+        px5 = sw + spacing * 2
+        px4 = sw - pw0
+        px3 = px4 - ph0
+        if px2 > px3:
+            px2, px3 = px3, px2
+
+        if rng.random() < 0.5:
+            py0, py1 = py1, py0
+
+        brushsize = 3
+        # brushsize = random.randint(2, 3)
+
+        ims, ctx = SciFiTex.new_surface(sw, sh, pool)
+        ctx.set_line_cap(cairo.LINE_CAP_ROUND)
+        ctx.set_line_join(cairo.LINE_JOIN_MITER)
+        ctx.set_line_width(brushsize)
+        ctx.set_source_rgba(fgcol, fgcol, fgcol)
+        ctx.move_to(px0, py0)
+        ctx.line_to(px1, py0)
+        ctx.line_to(px2, py1)
+        ctx.line_to(px3, py1)
+        ctx.line_to(px4, py0)
+        ctx.line_to(px5, py0)
+        ctx.stroke()
+
+        return ims
+
+    @staticmethod
+    def draw_angled_line_c(area, spacing, fgcol, area_chk, pool=None, rng=None):
+        if rng is None:
+            rng = random
+        _, _, _, _, sw, sh = area
+        if sw <= area_chk or sh <= area_chk:
+            return None
+
+        px0 = math.floor(-spacing * 2)
+        py0 = math.floor(rng.randint(2, 6) * sh / 10)
+        ang = 0
+        if rng.random() > 0.5:
+            px0 = math.floor(sw + spacing * 2)
+            ang = 180
+
+        if py0 <= sh / 2:
+            add_ang = 45 if ang == 0 else -45
+        else:
+            add_ang = -45 if ang == 0 else 45
+
+        dists = []
+        d0 = math.floor(rng.randint(3, 5) * sw / 10)
+        dists.append([d0, ang])
+        d1 = math.floor((sw if sw <= sh else sh) / 4)
+        dists.append([d1, add_ang])
+        dists.append([sh, add_ang])
+
+        x, y = px0, py0
+        ang = 0
+        pnts = []
+        pnts.append([x, y])
+        for dt in dists:
+            d, add_ang = dt
+            ang += add_ang
+            r = math.radians(ang)
+            x = math.floor(x + d * math.cos(r))
+            y = math.floor(y + d * math.sin(r))
+            pnts.append([x, y])
+
+        brushsize = 3
+        # brushsize = random.randint(2, 3)
+
+        ims, ctx = SciFiTex.new_surface(sw, sh, pool)
+        ctx.set_line_cap(cairo.LINE_CAP_ROUND)
+        ctx.set_line_join(cairo.LINE_JOIN_MITER)
+        ctx.set_line_width(brushsize)
+        ctx.set_source_rgba(fgcol, fgcol, fgcol)
+        x, y = pnts.pop(0)
+        ctx.move_to(x, y)
+        for x, y in pnts:
+            ctx.line_to(x, y)
+        ctx.stroke()
+
+        return ims
+
+    @staticmethod
+    def draw_rivet_box(area, rivetsize, rivetspc, chk, pool=None):
+        _, _, _, _, sw, sh = area
+        if sw < chk or sh < chk:
+            return None
+
+        px0 = math.floor(rivetspc / 2)
+        py0 = math.floor(rivetspc)
+        px1 = math.floor(sw - rivetspc / 2)
+        py1 = math.floor(sh - rivetspc - 1)
+        place_list = [[px0, py0], [px1, py0], [px1, py1], [px0, py1]]
+
+        # rivet box
+        col = 0.0
+        w = max([2, math.floor(rivetsize / 4)])
+        h = rivetsize
+        data = []
+        for x, y in place_list:
+            x0 = x - math.floor(w / 2.0)
+            y0 = y - math.floor(h / 2.0)
+            data.append([x0, y0, w, h])
+
+        ims, ctx = SciFiTex.new_surface(sw, sh, pool)
+        ctx.set_line_cap(cairo.LINE_CAP_BUTT)
+        ctx.set_line_join(cairo.LINE_JOIN_MITER)
+        ctx.set_line_width(0)
+        ctx.set_source_rgba(col, col, col)
+        for x, y, w, h in data:
+            ctx.rectangle(x, y, w, h)
+            ctx.fill()
+
+        return ims
+
+    @staticmethod
+    def get_rivet_col(rr, cx, bgcol, height_max):
+        """Get rivet color of the ring at radius cx (hemisphere profile)."""
+        col = bgcol + (math.sqrt(rr * rr - cx * cx) * height_max / rr)
+        return min([1.0, col])
+
+    @staticmethod
+    def get_rivet_rings(rr, bgcol, height_max):
+        """Get [[radius, color], ...] of the rings rr, rr - 1, ... (> = 1)."""
+        rings = []
+        cx = rr
+        while cx >= 1.0:
+            rings.append([cx, SciFiTex.get_rivet_col(rr, cx, bgcol, height_max)])
+            cx = cx - 1.0
+        return rings
+
+    @staticmethod
+    def get_rivet_gradient(rings):
+        """Get shading pattern of rings (center 0, 0, outermost first).
+
+        Same stepped profile as filling the circles from the outside in.
+        Each step edge is a linear ramp one pixel wide, which stands in
+        for the antialiased edge of each circle. Only close to it when
+        the steps are small, see fill_rivets().
+        Return None if rings is empty.
+        """
+        if len(rings) == 0:
+            return None
+
+        r0 = rings[0][0]
+        pat = cairo.RadialGradient(0, 0, 0, 0, 0, r0)
+        pat.set_extend(cairo.EXTEND_PAD)
+        for cx, col in reversed(rings):
+            pat.add_color_stop_rgb((cx - 0.5) / r0, col, col, col)
+        return pat
+
+    @staticmethod
+    def fill_rivets(ctx, place_lst, rr, bgcol, height_max, gradient=True):
+        """Fill circle rivets of radius rr at place_lst, ring by ring.
+
+        gradient : True = fill the outer rings up to the last gray step
+        bigger than RIVET_GRADIENT_STEP one by one, and the inner rings
+        with one radial gradient per rivet. The rivets must not overlap.
+        """
+        rings = SciFiTex.get_rivet_rings(rr, bgcol, height_max)
+        n = len(rings)
+        if gradient:
+            lv = [int(round(col * 255.0)) for _, col in rings]
+            while n > 1 and abs(lv[n - 1] - lv[n - 2]) <= SciFiTex.RIVET_GRADIENT_STEP:
+                n -= 1
+            n = max([n - 1, 0])
+
+        for cx, col in rings[:n]:
+            ctx.set_source_rgba(col, col, col)
+            for x, y in place_lst:
+                ctx.arc(x, y, cx, 0, 2 * math.pi)
+                ctx.fill()
+
+        pat = SciFiTex.get_rivet_gradient(rings[n:])
+        if pat is not None:
+            for x, y in place_lst:
+                ctx.save()
+                ctx.translate(x, y)
+                ctx.set_source(pat)
+                ctx.arc(0, 0, rings[n][0], 0, 2 * math.pi)
+                ctx.fill()
+                ctx.restore()
+
+    @staticmethod
+    def draw_rivet(area, bgcol, rivetsize, rivetspc, rivet_h, bg_enable, chk, pool=None,
+                   gradient=True, stamps=None):
+        x0, y0, x1, y1, sw, sh = area
+        if sw < chk or sh < chk:
+            return
+
+        height_max = (rivet_h / 256.0)
+
+        px0 = math.floor(rivetspc)
+        py0 = math.floor(rivetspc)
+        px1 = math.floor(sw - rivetspc - 1)
+        py1 = math.floor(sh - rivetspc - 1)
+        place_lst = [[px0, py0], [px1, py0], [px1, py1], [px0, py1]]
+
+        ims, ctx = SciFiTex.new_surface(sw, sh, pool)
+
+        rb = rivetsize / 2.0 + (3.0 if bg_enable else 0.0)
+        if stamps is not None and px1 - px0 >= rb * 2 + 2 and py1 - py0 >= rb * 2 + 2:
+            # blit cached rivet stamp. each lands on empty pixels,
+            # so it is the same as drawing (not when rivets overlap)
+            stamp, c = stamps.get(bgcol, rivetsize, rivet_h, bg_enable)
+            for x, y in place_lst:
+                ctx.set_source_surface(stamp, x - c, y - c)
+                ctx.paint()
+            return ims
+
+        ctx.set_line_cap(cairo.LINE_CAP_BUTT)
+        ctx.set_line_join(cairo.LINE_JOIN_MITER)
+        ctx.set_line_width(0)
+
+        if bg_enable:
+            # fill rivet background
+            ctx.set_source_rgba(bgcol, bgcol, bgcol)
+            r = rivetsize / 2.0 + 3.0
+            for x, y in place_lst:
+                ctx.arc(x, y, r, 0, 2 * math.pi)
+                ctx.fill()
+
+            # bgcol = (32.0 / 256.0)
+            bgcol = max([0.0, (bgcol - height_max)])
+            ctx.set_source_rgba(bgcol, bgcol, bgcol)
+            r = rivetsize / 2.0 + 1.0
+            for x, y in place_lst:
+                ctx.arc(x, y, r, 0, 2 * math.pi)
+                ctx.fill()
+
+        # rivet circle fuzzy
+        rr = rivetsize / 2.0
+        if px1 - px0 < rivetsize + 2 or py1 - py0 < rivetsize + 2:
+            # overlapping rivets are drawn ring by ring over each other
+            gradient = False
+        SciFiTex.fill_rivets(ctx, place_lst, rr, bgcol, height_max, gradient)
+
+        return ims
+
+    @staticmethod
+    def get_min_rect_size(spc):
+        """Rects with width or height <= this are never drawn by generate().
+
+        generate() shrinks each rect by spc on every side and skips it
+        if nothing is left. The background fill and the border do not
+        depend on drawtype or rivets, so spc is the only limit.
+        """
+        return 2 * int(spc)
+
+    @staticmethod
+    def generate(imgw, imgh, rects, spc, borderradius,
+                 rivet_enable, rivet_spc, rivet_size, rivet_h, rivet_bg, rivet_type,
+                 fill_col=None, drawtype="All", bordercol=64, pool=True, stamps=True,
+                 seed=None, window=None, rect_ids=None, progress=None, scale=1.0,
+                 target=None, fmt=cairo.FORMAT_ARGB32, rng=None):
+        """Fill rectangles.
+
+        pool : True = use one SurfacePool for this call,
+               SurfacePool instance = use (and keep) it,
+               None / False = allocate a new surface for each pattern.
+        stamps : True = use RIVET_STAMPS with a fixed fill_col,
+                 RivetStampCache instance = use it,
+                 None / False = draw circle rivets without stamp cache.
+                 Same output either way.
+        seed : None = draw with the current random state.
+               int = seed rng with DividedRect.get_rect_seed(seed, i)
+               before rects[i], so each rect is drawn the same way
+               whatever else is drawn.
+        window : (x, y, w, h). Render only this part of the image into
+                 a w x h surface. Use with seed.
+        rect_ids : indexes of rects to draw (default: all).
+        progress : progress(count, total, surface) is called before
+                   each rect. Return True to stop drawing.
+        scale : draw the same layout scaled (draft preview). The surface
+                is ceil(imgw * scale) x ceil(imgh * scale). Not with window.
+                Patterns are drawn to a scaled SurfacePool and circle
+                rivets without stamps.
+        target : (surface, x, y). Draw into an existing ARGB32 surface at
+                 (x, y), clipped to imgw x imgh (atlas cell), and return
+                 that surface. Not with window or scale.
+        fmt : surface format. Other than ARGB32 (FORMAT_RGBA128F, high
+              precision), patterns are drawn to a SurfacePool of the
+              same format and circle rivets without stamps (8 bit).
+        rng : random.Random instance used for colors and patterns
+              (default: the random module). Give each thread its own
+              instance to render concurrently.
+        """
+        if rng is None:
+            rng = random
+
+        if target is not None and (window is not None or scale != 1.0):
+            raise ValueError("target can not be used with window, scale")
+
+        if scale != 1.0:
+            if window is not None:
+                raise ValueError("scale can not be used with window")
+            window = (0, 0, int(math.ceil(imgw * scale)), int(math.ceil(imgh * scale)))
+            stamps = None
+            if not pool:
+                pool = True
+
+        if fmt != cairo.FORMAT_ARGB32:
+            stamps = None
+            if not pool:
+                pool = True
+
+        wx, wy, ww, wh = window if window is not None else (0, 0, imgw, imgh)
+        if target is not None:
+            surface, tx, ty = target
+            ctx = cairo.Context(surface)
+            ctx.translate(tx, ty)
+            ctx.rectangle(0, 0, imgw, imgh)
+            ctx.clip()
+        else:
+            surface = cairo.ImageSurface(fmt, ww, wh)
+            ctx = cairo.Context(surface)
+        if wx != 0 or wy != 0:
+            ctx.translate(-wx, -wy)
+        if scale != 1.0:
+            ctx.scale(scale, scale)
+            wx, wy, ww, wh = 0, 0, imgw, imgh
+
+        own_pool = pool is True
+        if own_pool:
+            pool = SurfacePool()
+        elif not pool:
+            pool = None
+        if pool is not None:
+            pool.scale = scale
+            pool.format = fmt
+
+        if stamps is True:
+            # random fill colors never share a stamp
+            stamps = RIVET_STAMPS if fill_col is not None else None
+        elif not stamps:
+            stamps = None
+
+        # fill backgorund
+        bg_col = min([1.0, (float(bordercol) / 256.0)])
+        # bg_col = 0.25
+        x0, y0 = 0, 0
+        x1, y1 = imgw, imgh
+        SciFiTex.draw_rect(ctx, x0, y0, x1, y1, bg_col, None, None, 0)
+
+        pat_kind_lst = [0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6, 7, 7]
+
+        if rect_ids is None:
+            rect_ids = range(len(rects))
+        total = len(rect_ids)
+
+        for count, i in enumerate(rect_ids):
+            if progress is not None and progress(count, total, surface):
+                break
+
+            bx0, by0, bx1, by1 = rects[i]
+            x0 = math.floor(bx0 + spc)
+            y0 = math.floor(by0 + spc)
+            x1 = math.floor(bx1 - spc)
+            y1 = math.floor(by1 - spc)
+            w0 = x1 - x0
+            h0 = y1 - y0
+
+            if w0 <= 0 or h0 <= 0 or x0 >= imgw or y0 >= imgh:
+                continue
+
+            # visible part of this rect
+            vx0 = max([x0, wx])
+            vy0 = max([y0, wy])
+            vx1 = min([x1, wx + ww])
+            vy1 = min([y1, wy + wh])
+            if vx1 <= vx0 or vy1 <= vy0:
+                continue
+
+            if seed is not None:
+                rng.seed(DividedRect.get_rect_seed(seed, i))
+
+            col = fill_col
+            if col is None:
+                col = 0.25 + rng.uniform((24.0 / 256.0), (80.0 / 256.0))
+
+            SciFiTex.draw_rect(ctx, x0, y0, x1, y1, col, None, None, borderradius)
+
+            if drawtype == "Rect only":
+                continue
+
+            kind = drawtype
+            if drawtype == "All":
+                idx = pat_kind_lst[rng.randint(0, len(pat_kind_lst) - 1)] + 2
+                kind = SciFiTex.PAT_KIND[idx]
+
+            # draw pattern
+            area = (x0, y0, x1, y1, int(w0), int(h0))
+            newsurf = None
+            rsurf = None
+            ox, oy = 0, 0
+            if pool is not None:
+                pool.set_view(vx0 - x0, vy0 - y0, vx1 - vx0, vy1 - vy0)
+                ox, oy = pool.get_origin()
+
+            if kind == "Lines":
+                # draw lines
+                fgcol = 0.0 if rng.random() <= 0.5 else rng.uniform(col * 1.05, col * 1.2)
+                fgcol = min([fgcol, 1.0])
+                count = rng.randint(3, 8)
+                horizontal = False if rng.random() < 0.5 else True
+                linespc = 12
+                chk = 28
+                newsurf = SciFiTex.draw_lines(
+                    area, spc, fgcol, linespc, horizontal, count, chk, pool, rng)
+            elif kind == "Box":
+                # draw box
+                # col = (32.0 / 256.0)
+                fgcol = col - rng.uniform(col * 0.3, col * 0.7)
+                fgcol = min([max([0.0, fgcol]), 1.0])
+                chk = 20
+                newsurf = SciFiTex.draw_box(area, spc, fgcol, chk, pool, rng)
+            elif kind == "Box fill":
+                # draw box fill
+                bspc = spc + 8
+                newsurf = SciFiTex.draw_box_fill(area, bspc, col, 28, pool, rng)
+            elif kind == "Box fill b":
+                # draw box fill b
+                bspc = spc + 8
+                newsurf = SciFiTex.draw_box_fill_b(area, bspc, col, 28, pool, rng)
+            elif kind == "Grid":
+                # draw grid
+                newsurf = SciFiTex.draw_grid(area, spc, 0.0, col, 12, 60, pool, rng)
+            elif kind == "Angle line a":
+                # draw angled line a
+                newsurf = SciFiTex.draw_angled_line(area, spc, bg_col, 28, pool, rng)
+            elif kind == "Angle line b":
+                # draw angled line b
+                newsurf = SciFiTex.draw_angled_line_b(area, spc, bg_col, 12, 12 * 4,
+                                                      pool, rng)
+            elif kind == "Angle line c":
+                # draw angled line c
+                newsurf = SciFiTex.draw_angled_line_c(area, spc, bg_col, 12 * 4, pool, rng)
+
+            if newsurf is not None:
+                ctx.save()
+                SciFiTex.set_rounder_rectangle(ctx, x0, y0, x1, y1, borderradius)
+                ctx.clip()
+                SciFiTex.paint_surface(ctx, newsurf, x0 + ox, y0 + oy, scale)
+                ctx.restore()
+                if pool is None:
+                    newsurf.finish()
+
+            if rivet_enable:
+                # draw rivet
+                if rivet_type == "Box":
+                    rsurf = SciFiTex.draw_rivet_box(area, rivet_size, rivet_spc, 64,
+                                                    pool)
+                elif rivet_type == "Circle":
+                    rsurf = SciFiTex.draw_rivet(area, col, rivet_size,
+                                                rivet_spc, rivet_h, rivet_bg, 36, pool,
+                                                True, stamps)
+
+                if rsurf is not None:
+                    ctx.save()
+                    SciFiTex.set_rounder_rectangle(ctx, x0, y0, x1, y1, borderradius)
+                    ctx.clip()
+                    SciFiTex.paint_surface(ctx, rsurf, x0 + ox, y0 + oy, scale)
+                    ctx.restore()
+                    if pool is None:
+                        rsurf.finish()
+
+        if own_pool:
+            pool.finish()
+        elif pool is not None:
+            pool.view = None
+            pool.scale = 1.0
+            pool.format = cairo.FORMAT_ARGB32
+
+        return surface
+
+    @staticmethod
+    def get_tile_rect_ids(rects, imgw, imgh, tile):
+        """Get {(col, row): [rect index, ...]} for tile x tile tiles."""
+        cols = (imgw + tile - 1) // tile
+        rows = (imgh + tile - 1) // tile
+        tiles = {}
+        for i, rect in enumerate(rects):
+            x0, y0, x1, y1 = rect
+            c0 = max([0, int(x0) // tile])
+            r0 = max([0, int(y0) // tile])
+            c1 = min([cols - 1, int(x1) // tile])
+            r1 = min([rows - 1, int(y1) // tile])
+            for r in range(r0, r1 + 1):
+                for c in range(c0, c1 + 1):
+                    tiles.setdefault((c, r), []).append(i)
+        return tiles
+
+    @staticmethod
+    def generate_tiles(imgw, imgh, rects, tile, seed, *args, **kwargs):
+        """Render the image as tile x tile surfaces, one at a time.
+
+        args, kwargs : generate() parameters after rects.
+        Yield (x, y, surface) in row-major order. Each tile draws only
+        the rects that overlap it, with per-rect seeds, so the tiles
+        are the same as the matching parts of
+        generate(..., seed=seed) and memory is bounded by the tile size.
+        """
+        own_pool = "pool" not in kwargs
+        if own_pool:
+            kwargs["pool"] = SurfacePool()
+        ids = SciFiTex.get_tile_rect_ids(rects, imgw, imgh, tile)
+        try:
+            for y in range(0, imgh, tile):
+                for x in range(0, imgw, tile):
+                    window = (x, y, min([tile, imgw - x]), min([tile, imgh - y]))
+                    rect_ids = ids.get((x // tile, y // tile), [])
+                    surface = SciFiTex.generate(imgw, imgh, rects, *args, seed=seed,
+                                                window=window, rect_ids=rect_ids,
+                                                **kwargs)
+                    yield x, y, surface
+        finally:
+            if own_pool:
+                kwargs["pool"].finish()
+
+
+# render_texture_parallel() worker state, set once per worker process
+_tile_job = None
+
+
+def _init_tile_worker(job):
+    global _tile_job
+    _tile_job = job
+
+
+def _render_tile_worker(task):
+    """Render one window. Return (x, y, w, h, stride, data)."""
+    imgw, imgh, rects, args, seed = _tile_job
+    x, y, w, h, rect_ids = task
+    surface = SciFiTex.generate(imgw, imgh, rects, *args, seed=seed,
+                                window=(x, y, w, h), rect_ids=rect_ids,
+                                rng=random.Random())
+    surface.flush()
+    data = bytes(surface.get_data())
+    stride = surface.get_stride()
+    surface.finish()
+    return x, y, w, h, stride, data
+
+
+def render_texture_parallel(params, tile=512, processes=0, stats=None):
+    """Render one texture from a parameter dict on a process pool.
+
+    The image is split into tile x tile windows (one task per window)
+    and the results are copied into one surface. Rects are drawn with
+    per-rect seeds, so the result is byte-identical to
+    render_texture() with rect_seed, whatever the number of processes.
+    Return (surface, seed).
+    """
+    w, h, rects, args, nseed = get_texture_layout(params, stats, random.Random())
+    ids = SciFiTex.get_tile_rect_ids(rects, w, h, tile)
+    tasks = []
+    for y in range(0, h, tile):
+        for x in range(0, w, tile):
+            tasks.append((x, y, min([tile, w - x]), min([tile, h - y]),
+                          ids.get((x // tile, y // tile), [])))
+
+    job = (w, h, rects, args, nseed)
+    if processes <= 0:
+        processes = multiprocessing.cpu_count()
+    processes = min([processes, len(tasks)])
+    if processes == 1:
+        _init_tile_worker(job)
+        results = map(_render_tile_worker, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes, _init_tile_worker, (job,))
+        results = pool.imap_unordered(_render_tile_worker, tasks)
+
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, w, h)
+    ctx = cairo.Context(surface)
+    ctx.set_operator(cairo.OPERATOR_SOURCE)
+    try:
+        for x, y, tw, th, stride, data in results:
+            tsurf = cairo.ImageSurface.create_for_data(bytearray(data), cairo.FORMAT_ARGB32,
+                                                       tw, th, stride)
+            ctx.set_source_surface(tsurf, x, y)
+            ctx.rectangle(x, y, tw, th)
+            ctx.fill()
+            tsurf.finish()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return surface, nseed
+
+
+# ARGB32 (native endian uint32) byte index -> R, G, B, A
+if sys.byteorder == "little":
+    RGBA_ORDER = [2, 1, 0, 3]
+else:
+    RGBA_ORDER = [1, 2, 3, 0]
+
+
+def surface_to_pil_image(surface):
+    """Convert pycairo ARGB32 surface to PIL Image (RGBA).
+
+    Decode straight from the cairo buffer with the raw mode that
+    matches the native byte order. One copy, no split / merge.
+    A8 surface (render_texture_gray()) : PIL Image (L).
+    """
+    from PIL import Image
+
+    w, h = surface.get_width(), surface.get_height()
+    surface.flush()
+    if surface.get_format() == cairo.FORMAT_A8:
+        return Image.frombuffer("L", (w, h), surface.get_data(), "raw",
+                                "L", surface.get_stride(), 1)
+    rawmode = "BGRA" if sys.byteorder == "little" else "ARGB"
+    return Image.frombuffer("RGBA", (w, h), surface.get_data(), "raw",
+                            rawmode, surface.get_stride(), 1)
+
+
+# bump this when the same parameters give a different image
+# (invalidates scifitex_cache.RenderCache)
+GENERATOR_VERSION = 1
+
+DEFAULT_PARAMS = {
+    "imgsize": 512,
+    "dmin": 1,
+    "dmax": 3,
+    "cntmax": 4,
+    "spc": 2,
+    "borderradius": 2,
+    "rivet_enable": True,
+    "rivet_type": "Box",
+    "rivet_bg": False,
+    "rivet_spc": 8,
+    "rivet_size": 9,
+    "rivet_h": 12,
+    "colrandomize": True,
+    "fillcol": 160,
+    "bordercol": 64,
+    "randomize": False,
+    "seed": 42,
+    "drawtype": "All",
+    "rect_seed": False,
+    "cull": False,
+    "makeup": False,
+    "maps": False,
+    "gray": False,
+    "height": "",
+    "raw": False,
+    "scale": 1.0,
+}
+
+
+def get_params(params=None):
+    """Return DEFAULT_PARAMS updated with params."""
+    p = dict(DEFAULT_PARAMS)
+    if params:
+        p.update(params)
+    return p
+
+
+def get_texture_layout(params, stats=None, rng=None):
+    """Seed rng and divide rectangle for a parameter dict.
+
+    Return (w, h, rects, args, seed). args are the SciFiTex.generate()
+    parameters after rects. seed is the seed actually used
+    (differs from params["seed"] when params["randomize"] is set).
+
+    With params["cull"], rects too small to be drawn (see
+    SciFiTex.get_min_rect_size()) are dropped while dividing, with
+    everything inside them. Faster for deep cntmax, but the layout
+    differs from the uncull one. stats : see DividedRect.divide().
+    rng : random.Random instance (default: the random module), left
+    in the state to draw with.
+    """
+    p = get_params(params)
+    w = h = int(p["imgsize"])
+    fillcol = None if p["colrandomize"] else (float(p["fillcol"]) / 256.0)
+
+    nseed = DividedRect.init_random_seed(int(p["seed"]), p["randomize"], rng)
+    min_size = SciFiTex.get_min_rect_size(p["spc"]) if p["cull"] else 0
+    rects = DividedRect.divide(w, h, int(p["dmin"]), int(p["dmax"]), int(p["cntmax"]),
+                               min_size=min_size, stats=stats, rng=rng)
+    args = (int(p["spc"]), int(p["borderradius"]),
+            p["rivet_enable"], int(p["rivet_spc"]),
+            int(p["rivet_size"]), int(p["rivet_h"]),
+            p["rivet_bg"], p["rivet_type"], fillcol,
+            p["drawtype"], int(p["bordercol"]))
+    return w, h, rects, args, nseed
+
+
+def render_texture(params, stats=None, progress=None, target=None):
+    """Render one texture from a parameter dict.
+
+    Return (surface, seed). With params["rect_seed"], every rect is
+    drawn with its own seed (same output as render_texture_tiles()).
+    stats : dict, filled by get_texture_layout().
+    progress : see SciFiTex.generate().
+    With params["scale"] != 1.0, the same layout is drawn scaled
+    (draft preview, see SciFiTex.generate()).
+    target : (surface, x, y). Draw into a part of surface (atlas cell),
+    see SciFiTex.generate().
+    Uses its own random.Random, so renders in several threads do not
+    disturb each other (or the random module).
+    """
+    p = get_params(params)
+    rng = random.Random()
+    w, h, rects, args, nseed = get_texture_layout(p, stats, rng)
+    seed = nseed if p["rect_seed"] else None
+    surface = SciFiTex.generate(w, h, rects, *args, seed=seed, progress=progress,
+                                scale=float(p["scale"]), target=target, rng=rng)
+    return surface, nseed
+
+
+def render_texture_tiles(params, tile, stats=None, fmt=cairo.FORMAT_ARGB32):
+    """Render one texture from a parameter dict as tiles.
+
+    Return (seed, generator of (x, y, surface)). See
+    SciFiTex.generate_tiles(). Always uses per-rect seeds.
+    fmt : tile surface format, see SciFiTex.generate().
+    """
+    rng = random.Random()
+    w, h, rects, args, nseed = get_texture_layout(params, stats, rng)
+    return nseed, SciFiTex.generate_tiles(w, h, rects, tile, nseed, *args, fmt=fmt,
+                                          rng=rng)
+
+
+def copy_gray(src, dst, dst_stride, x, y):
+    """Copy gray (green byte) of a gray ARGB32 surface to dst at (x, y).
+
+    dst : 8-bit per pixel buffer (bytearray), dst_stride bytes per row.
+    """
+    src.flush()
+    w, h, stride = src.get_width(), src.get_height(), src.get_stride()
+    data = bytes(src.get_data())
+    g = RGBA_ORDER[1]
+    for i in range(h):
+        p = (y + i) * dst_stride + x
+        s = i * stride + g
+        dst[p:p + w] = data[s:s + w * 4:4]
+
+
+def render_texture_gray(params, tile=512, stats=None):
+    """Render one texture from a parameter dict as 8-bit gray.
+
+    All colors are grays, so one byte per pixel is enough. The
+    patterns are still drawn in ARGB32 : tiles of render_texture_tiles()
+    are copied into one cairo FORMAT_A8 surface (gray stored as alpha),
+    so memory is 1/4 of an ARGB32 surface plus one tile. write_to_png() of it saves an 8-bit
+    grayscale png. Same gray as render_texture() with rect_seed.
+    Return (surface, seed).
+    """
+    w = h = int(get_params(params)["imgsize"])
+    seed, tiles = render_texture_tiles(params, tile, stats)
+    stride = cairo.ImageSurface.format_stride_for_width(cairo.FORMAT_A8, w)
+    buf = bytearray(stride * h)
+    for x, y, surface in tiles:
+        copy_gray(surface, buf, stride, x, y)
+        surface.finish()
+    return cairo.ImageSurface.create_for_data(buf, cairo.FORMAT_A8, w, h, stride), seed
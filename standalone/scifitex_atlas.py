@@ -0,0 +1,162 @@
+#!python
+# -*- mode: python; Encoding: utf-8; coding: utf-8 -*-
+"""
+Texture atlas (trim sheet) of many Sci-Fi texture variants.
+
+Each parameter set (seed) is rendered straight into its grid cell
+of one large surface, no png round trip and no stitching. With
+several processes the atlas pixels live in shared memory
+(multiprocessing.RawArray) and every worker draws its cells into it
+with cairo.ImageSurface.create_for_data(), so nothing is copied back.
+
+A cell is the same image as scifitex.render_texture() of its
+parameter set. The JSON manifest lists the pixel and UV rect of each
+cell (origin top-left, v down) with its parameters and seed.
+
+usage:
+    from scifitex_atlas import render_atlas, save_atlas
+    surface, manifest = render_atlas([{"seed": s} for s in range(64)], cols=8)
+    save_atlas(surface, manifest, "atlas.png")   # atlas.png, atlas.json
+
+Author: mieki256
+License: CC0 / Public Domain
+require: Python, pycairo
+
+"""
+
+import os
+import json
+import math
+import multiprocessing
+import multiprocessing.sharedctypes
+
+import cairo
+
+from scifitex import GENERATOR_VERSION, get_params, render_texture
+
+
+def get_atlas_layout(param_list, cols=0, padding=0):
+    """Place one cell per parameter set on a grid, row by row.
+
+    cols : grid columns (0: about square). The cell pitch is the
+    largest imgsize plus padding. Smaller textures use the top-left
+    part of their cell.
+    Return (width, height, cols, rows, [[x, y, w, h], ...]).
+    """
+    n = len(param_list)
+    if n == 0:
+        raise ValueError("no parameter sets")
+    if cols <= 0:
+        cols = int(math.ceil(math.sqrt(n)))
+    cols = min([cols, n])
+    rows = (n + cols - 1) // cols
+    sizes = [int(get_params(p)["imgsize"]) for p in param_list]
+    pitch = max(sizes) + padding
+
+    cells = []
+    for i, size in enumerate(sizes):
+        x = padding + (i % cols) * pitch
+        y = padding + (i // cols) * pitch
+        cells.append([x, y, size, size])
+    return padding + cols * pitch, padding + rows * pitch, cols, rows, cells
+
+
+# render_atlas() worker state, set once per worker process
+_atlas = None
+
+
+def _init_atlas_worker(buf, w, h, stride):
+    global _atlas
+    _atlas = cairo.ImageSurface.create_for_data(buf, cairo.FORMAT_ARGB32, w, h, stride)
+
+
+def _render_atlas_worker(task):
+    """Render one cell into the atlas. Return (index, seed, rects, culled)."""
+    i, x, y, params = task
+    stats = {}
+    _, seed = render_texture(params, stats, target=(_atlas, x, y))
+    _atlas.flush()
+    return i, seed, stats.get("rects", 0), stats.get("culled", 0)
+
+
+def render_atlas(param_list, cols=0, padding=0, processes=0, stats=None):
+    """Render parameter sets into one atlas surface.
+
+    cols, padding : see get_atlas_layout().
+    processes : number of worker processes (0: cpu count).
+    stats : dict, gets the total "rects" and "culled".
+    Return (surface, manifest dict). See get_manifest().
+    """
+    plist = [dict(get_params(p), scale=1.0) for p in param_list]
+    w, h, cols, rows, cells = get_atlas_layout(plist, cols, padding)
+    stride = cairo.ImageSurface.format_stride_for_width(cairo.FORMAT_ARGB32, w)
+    tasks = [(i, cells[i][0], cells[i][1], p) for i, p in enumerate(plist)]
+
+    if processes <= 0:
+        processes = multiprocessing.cpu_count()
+    processes = min([processes, len(tasks)])
+    if processes == 1:
+        buf = bytearray(stride * h)
+        _init_atlas_worker(buf, w, h, stride)
+        results = map(_render_atlas_worker, tasks)
+        pool = None
+    else:
+        # zero filled, shared with the workers
+        buf = multiprocessing.sharedctypes.RawArray("B", stride * h)
+        pool = multiprocessing.Pool(processes, _init_atlas_worker, (buf, w, h, stride))
+        results = pool.imap_unordered(_render_atlas_worker, tasks)
+
+    seeds = [None] * len(plist)
+    try:
+        for i, seed, rects, culled in results:
+            seeds[i] = seed
+            if stats is not None:
+                stats["rects"] = stats.get("rects", 0) + rects
+                stats["culled"] = stats.get("culled", 0) + culled
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    global _atlas
+    _atlas = None
+    surface = cairo.ImageSurface.create_for_data(buf, cairo.FORMAT_ARGB32, w, h, stride)
+    return surface, get_manifest(w, h, cols, rows, padding, cells, plist, seeds)
+
+
+def get_manifest(w, h, cols, rows, padding, cells, param_list, seeds):
+    """Get atlas manifest dict (JSON friendly).
+
+    cells[i] : index, x, y, w, h (pixels), uv [u0, v0, u1, v1]
+    (0.0 - 1.0, origin top-left), seed and params. params has the
+    seed actually used, so it renders the cell again.
+    """
+    lst = []
+    for i, (x, y, cw, ch) in enumerate(cells):
+        p = dict(param_list[i])
+        p["seed"] = seeds[i]
+        p["randomize"] = False
+        lst.append({
+            "index": i,
+            "x": x, "y": y, "w": cw, "h": ch,
+            "uv": [float(x) / w, float(y) / h, float(x + cw) / w, float(y + ch) / h],
+            "seed": seeds[i],
+            "params": p,
+        })
+    return {
+        "generator_version": GENERATOR_VERSION,
+        "width": w, "height": h,
+        "cols": cols, "rows": rows,
+        "padding": padding,
+        "cells": lst,
+    }
+
+
+def save_atlas(surface, manifest, path):
+    """Save atlas png to path and manifest to NAME.json. Return json path."""
+    surface.write_to_png(path)
+    manifest = dict(manifest, image=os.path.basename(path))
+    fn = os.path.splitext(path)[0] + ".json"
+    with open(fn, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return fn
@@ -0,0 +1,182 @@
+#!python
+# -*- mode: python; Encoding: utf-8; coding: utf-8 -*-
+"""
+On-disk render cache for scifitex.
+
+The output is fixed by the parameters and the seed, so rendered
+surfaces are saved as png files named by a hash of all generate()
+inputs and GENERATOR_VERSION. Least recently used files are removed
+when the cache grows over max_bytes. Safe to share between processes.
+
+usage:
+    from scifitex_cache import RenderCache
+    cache = RenderCache("cache_dir")
+    surface, seed, hit = cache.render(params)
+
+Author: mieki256
+License: CC0 / Public Domain
+require: Python, pycairo
+
+"""
+
+import os
+import json
+import hashlib
+
+import cairo
+
+from scifitex import GENERATOR_VERSION, DEFAULT_PARAMS, get_params, render_texture
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "scifitex")
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+# params that do not change the rendered surface
+IGNORE_KEYS = ["randomize", "makeup", "maps", "gray", "height", "raw"]
+
+
+def replace_file(src, dst):
+    """Rename src to dst, overwrite dst."""
+    try:
+        os.replace(src, dst)
+    except AttributeError:
+        # Python 2.7
+        if os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
+class RenderCache(object):
+    """Content-addressed png cache with LRU eviction by total size."""
+
+    def __init__(self, path=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(path)
+            except OSError:
+                # made by another process
+                if not os.path.isdir(path):
+                    raise
+
+    @staticmethod
+    def get_key(params, seed=None):
+        """Get cache key (hex string) of params. seed : the seed actually used."""
+        p = get_params(params)
+        if seed is not None:
+            p["seed"] = seed
+        d = {}
+        for k in sorted(DEFAULT_PARAMS.keys()):
+            if k in IGNORE_KEYS:
+                continue
+            v = p[k]
+            if isinstance(DEFAULT_PARAMS[k], bool):
+                v = bool(v)
+            elif isinstance(DEFAULT_PARAMS[k], float):
+                v = float(v)
+            elif isinstance(DEFAULT_PARAMS[k], int):
+                v = int(v)
+            d[k] = v
+        if d["colrandomize"]:
+            # fillcol is not used
+            d["fillcol"] = 0
+        s = json.dumps([GENERATOR_VERSION, d], sort_keys=True)
+        return hashlib.sha1(s.encode("utf-8")).hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.path, key + ".png")
+
+    def get(self, key):
+        """Return cached surface or None."""
+        fn = self.get_path(key)
+        try:
+            surface = cairo.ImageSurface.create_from_png(fn)
+        except (IOError, OSError, MemoryError, cairo.Error):
+            self.misses += 1
+            return None
+        try:
+            # mark as recently used
+            os.utime(fn, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return surface
+
+    def put(self, key, surface):
+        """Save surface. Remove old files if the cache is too big."""
+        fn = self.get_path(key)
+        tmp = "%s.%d.tmp" % (fn, os.getpid())
+        surface.write_to_png(tmp)
+        replace_file(tmp, fn)
+        self.evict()
+
+    def get_files(self):
+        """Return [[mtime, size, path], ...] of cached files, oldest first."""
+        lst = []
+        for fn in os.listdir(self.path):
+            if not fn.endswith(".png"):
+                continue
+            path = os.path.join(self.path, fn)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            lst.append([st.st_mtime, st.st_size, path])
+        lst.sort()
+        return lst
+
+    def get_size(self):
+        """Total size of cached files (bytes)."""
+        return sum([d[1] for d in self.get_files()])
+
+    def evict(self):
+        """Remove least recently used files until total size <= max_bytes."""
+        files = self.get_files()
+        total = sum([d[1] for d in files])
+        for mtime, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for mtime, size, path in self.get_files():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def render(self, params, stats=None, progress=None):
+        """Render like scifitex.render_texture(), use the cache.
+
+        With params["randomize"], the seed is not known before
+        rendering, so there is no lookup, and the result is not saved
+        (a time based seed is never asked for again).
+        A render stopped by progress is not saved. stats is not
+        filled on a cache hit.
+        Return (surface, seed, hit).
+        """
+        p = get_params(params)
+        if not p["randomize"]:
+            surface = self.get(self.get_key(p))
+            if surface is not None:
+                return surface, int(p["seed"]), True
+
+        stopped = []
+
+        def prog(count, total, surface):
+            if progress(count, total, surface):
+                stopped.append(count)
+                return True
+            return False
+
+        surface, seed = render_texture(p, stats, prog if progress is not None else None)
+        if len(stopped) == 0 and not p["randomize"]:
+            self.put(self.get_key(p, seed), surface)
+        return surface, seed, False
@@ -0,0 +1,96 @@
+#!python
+# -*- mode: python; Encoding: utf-8; coding: utf-8 -*-
+"""
+High precision (float) height output for the Sci-Fi bump texture.
+
+SciFiTex.generate() normally draws to 8-bit ARGB32, so subtle fill
+offsets and rivet shading are quantized to 256 levels and band once
+they become normals. Here the texture is drawn tile by tile to
+cairo FORMAT_RGBA128F surfaces (32-bit float per channel) and the
+gray is gathered into one float32 height array, saved as a 16-bit
+grayscale png or raw float heights (.npy).
+
+Needs cairo >= 1.17.2 and a pycairo with FORMAT_RGBA128F.
+
+usage:
+    from scifitex_height import render_texture_height, save_height_png16
+    height, seed = render_texture_height(params)    # (h, w) float32, 0.0 - 1.0
+    save_height_png16(height, "height.png")
+
+Author: mieki256
+License: CC0 / Public Domain
+require: Python, pycairo, NumPy (Pillow for save_height_png16())
+
+"""
+
+import os
+
+import numpy
+import cairo
+
+from scifitex import get_params, render_texture_tiles
+
+
+FORMAT_FLOAT = getattr(cairo, "FORMAT_RGBA128F", None)
+
+
+def has_float_format():
+    """True if cairo and pycairo can draw to FORMAT_RGBA128F."""
+    return FORMAT_FLOAT is not None and cairo.cairo_version() >= 11702
+
+
+def surface_to_height(surface):
+    """Get (h, w) float32 gray from a gray FORMAT_RGBA128F surface."""
+    surface.flush()
+    w, h, stride = surface.get_width(), surface.get_height(), surface.get_stride()
+    a = numpy.frombuffer(surface.get_data(), numpy.float32).reshape(h, stride // 4)
+    # R, G, B, A floats. use green
+    return a[:, 1:w * 4:4]
+
+
+def render_texture_height(params, tile=512, stats=None):
+    """Render one texture from a parameter dict as float heights.
+
+    Memory is the float32 height (same as one ARGB32 surface) plus
+    one tile x tile float surface (16 bytes per pixel).
+    Same layout as render_texture() with rect_seed.
+    Return ((h, w) float32 array 0.0 - 1.0, seed).
+    """
+    if not has_float_format():
+        raise RuntimeError("high precision needs cairo >= 1.17.2 and pycairo"
+                           " with FORMAT_RGBA128F (cairo %s)" % cairo.cairo_version_string())
+    w = h = int(get_params(params)["imgsize"])
+    seed, tiles = render_texture_tiles(params, tile, stats, FORMAT_FLOAT)
+    height = numpy.empty((h, w), numpy.float32)
+    for x, y, surface in tiles:
+        a = surface_to_height(surface)
+        height[y:y + a.shape[0], x:x + a.shape[1]] = a
+        surface.finish()
+    return numpy.clip(height, 0.0, 1.0, out=height), seed
+
+
+def height_to_uint16(height):
+    """Get (h, w) uint16 array (0 - 65535) from float heights."""
+    return numpy.rint(height * 65535.0).astype(numpy.uint16)
+
+
+def save_height_png16(height, path):
+    """Save float heights as a 16-bit grayscale png."""
+    from PIL import Image
+
+    Image.fromarray(height_to_uint16(height)).save(path)
+
+
+def save_height_raw(height, path):
+    """Save float heights as NAME.npy (float32). Return the path."""
+    fn = os.path.splitext(path)[0] + ".npy"
+    numpy.save(fn, height.astype(numpy.float32))
+    return fn
+
+
+def save_height(height, path, kind="png16"):
+    """Save float heights. kind : "png16" (to path) or "npy". Return the path."""
+    if kind == "npy":
+        return save_height_raw(height, path)
+    save_height_png16(height, path)
+    return path
@@ -0,0 +1,406 @@
+#!python
+# -*- mode: python; Encoding: utf-8; coding: utf-8 -*-
+"""
+Sci-Fi texture makeup with NumPy.
+
+Headless port of sci-fi-texture-makeup.scm (GIMP Script-Fu).
+Turn a SciFiTex.generate() bump texture into a colored texture
+with the same layer stack (bottom to top) :
+
+    bump texture
+    emboss          multiply
+    gauss           divide      50%
+    gauss           soft light  50%
+    edge, invert    multiply
+    solid noise 2   burn        25%  colorize 200, 35, 10 + HSV noise
+    solid noise 1   screen      25%  colorize 126, 28, 0 + rotate 180
+    solid noise 0   burn        25%  colorize 37, 30, 0
+
+Filters follow the GIMP 2.8 plug-ins and the legacy layer modes.
+The image is processed in bands of rows, so memory use does not
+grow with the number of layers. The result does not depend on the
+band size.
+
+Differences from the GIMP script :
+    * solid noise : same parameters (tileable, detail 1, size 4 x 4),
+      but the gradients come from NumPy's RandomState, not GIMP's
+      random sequence. Same look, different pattern for a seed.
+    * HSV noise : same holdness / hue / saturation / value, but the
+      random numbers are hashed from the seed and the pixel position
+      instead of drawn from one stream, so the noise differs.
+    * gauss : a sampled gauss kernel, not GIMP's RLE method.
+    * layers are blended in float and rounded once at the end,
+      GIMP rounds each layer to 8 bit. Can differ by a level or so.
+    * image borders repeat the edge pixels for all filters.
+
+usage:
+    from scifitex_makeup import makeup_surface, makeup_pil_image
+    rgb = makeup_surface(surface)   # (h, w, 3) uint8 array
+    im = makeup_pil_image(surface)  # PIL Image
+
+Author: mieki256
+License: CC0 / Public Domain
+require: Python, NumPy (Pillow for makeup_pil_image())
+
+"""
+
+import sys
+import math
+
+import numpy
+
+
+BAND = 256
+
+# plug-in-emboss : azimuth, elevation, depth
+EMBOSS = (120.0, 40.0, 6)
+
+# plug-in-gauss : radius
+GAUSS_RADIUS = 6
+
+# plug-in-edge : amount (Laplace)
+EDGE_AMOUNT = 2.0
+
+# solid noise layers, bottom to top.
+# [seed, colorize (hue, saturation, lightness), mode, opacity,
+#  rotate 180, hsv noise (holdness, hue, saturation, value)]
+NOISE_LAYERS = [
+    [3767556749, (200, 35, 10), "burn", 0.25, False, (3, 13, 24, 30)],
+    [436305492, (126, 28, 0), "screen", 0.25, True, None],
+    [3442539593, (37, 30, 0), "burn", 0.25, False, None],
+]
+
+
+def gauss_kernel(radius):
+    """Get 1D gauss kernel for plug-in-gauss radius."""
+    r = abs(radius) + 1.0
+    std_dev = math.sqrt(-(r * r) / (2.0 * math.log(1.0 / 255.0)))
+    # the curve falls to 1/255 at r
+    n = int(r)
+    x = numpy.arange(-n, n + 1, dtype=numpy.float32)
+    k = numpy.exp(-(x * x) / (2.0 * std_dev * std_dev))
+    return (k / k.sum()).astype(numpy.float32)
+
+
+def get_margin():
+    """Rows / columns of neighbours the filters need."""
+    return max([len(gauss_kernel(GAUSS_RADIUS)) // 2, 1])
+
+
+def _shifted(a, m, dy, dx):
+    h, w = a.shape[0] - m * 2, a.shape[1] - m * 2
+    return a[m + dy:m + dy + h, m + dx:m + dx + w]
+
+
+def emboss(a, m, azimuth, elevation, depth):
+    """Emboss. a : gray with m pixel margin. Return shade (0 - 255).
+
+    Same as plug-in-emboss (emboss mode) on a RGB image whose
+    channels are all a.
+    """
+    def s(dy, dx):
+        return _shifted(a, m, dy, dx)
+
+    az = math.radians(azimuth)
+    el = math.radians(elevation)
+    lx = math.cos(az) * math.cos(el) * 255.9
+    ly = math.sin(az) * math.cos(el) * 255.9
+    lz = math.sin(el) * 255.9
+    nz = 6.0 * 255.0 / depth
+
+    # sum of 3 channels
+    nx = (s(-1, -1) + s(0, -1) + s(1, -1) - s(-1, 1) - s(0, 1) - s(1, 1)) * 3.0
+    ny = (s(1, -1) + s(1, 0) + s(1, 1) - s(-1, -1) - s(-1, 0) - s(-1, 1)) * 3.0
+
+    # flat (nx = ny = 0) gives lz
+    ndotl = nx * lx + ny * ly + nz * lz
+    shade = numpy.maximum(ndotl, 0.0) / numpy.sqrt(nx * nx + ny * ny + nz * nz)
+    return numpy.floor(shade)
+
+
+def gauss(a, m, radius):
+    """Separable gauss blur. a : gray with m pixel margin."""
+    k = gauss_kernel(radius)
+    n = len(k) // 2
+    h, w = a.shape[0] - m * 2, a.shape[1] - m * 2
+
+    t = numpy.zeros((a.shape[0], w), numpy.float32)
+    for i, v in enumerate(k):
+        t += a[:, m - n + i:m - n + i + w] * v
+
+    dst = numpy.zeros((h, w), numpy.float32)
+    for i, v in enumerate(k):
+        dst += t[m - n + i:m - n + i + h] * v
+    return numpy.rint(dst)
+
+
+def edge_laplace(a, m, amount):
+    """Laplace edge detect. a : gray with m pixel margin. Return 0 - 255."""
+    def s(dy, dx):
+        return _shifted(a, m, dy, dx)
+
+    lap = (s(-1, -1) + s(-1, 0) + s(-1, 1) + s(0, -1)
+           + s(0, 1) + s(1, -1) + s(1, 0) + s(1, 1) - s(0, 0) * 8.0)
+    return numpy.clip(numpy.abs(lap) * amount, 0.0, 255.0)
+
+
+class SolidNoise(object):
+    """Tileable gradient noise like plug-in-solid-noise."""
+
+    def __init__(self, seed, detail=1, xsize=4, ysize=4):
+        rng = numpy.random.RandomState(seed & 0xffffffff)
+        self.octaves = []
+        for i in range(detail + 1):
+            s = 1 << i
+            ang = rng.uniform(0.0, 2.0 * math.pi, (ysize * s, xsize * s))
+            self.octaves.append((s, numpy.cos(ang).astype(numpy.float32),
+                                 numpy.sin(ang).astype(numpy.float32)))
+
+    def get(self, w, h, y0, y1):
+        """Get rows y0 - y1 of a w x h noise image. Values 0.0 - 1.0."""
+        x = ((numpy.arange(w) + 0.5) / w).astype(numpy.float32)
+        y = ((numpy.arange(y0, y1) + 0.5) / h).astype(numpy.float32)
+        total = numpy.zeros((y1 - y0, w), numpy.float32)
+        amp = 0.0
+        for s, gx, gy in self.octaves:
+            gh, gw = gx.shape
+            fx = x * gw
+            fy = y * gh
+            ix = numpy.floor(fx).astype(numpy.intp)
+            iy = numpy.floor(fy).astype(numpy.intp)
+            tx = fx - ix
+            ty = fy - iy
+            ix0, ix1 = ix % gw, (ix + 1) % gw
+            iy0, iy1 = iy % gh, (iy + 1) % gh
+
+            def corner(cy, cx, dy, dx):
+                # pick columns first (few grid rows), then whole rows
+                return (gx[:, cx][cy] * dx[None, :]
+                        + gy[:, cx][cy] * dy[:, None])
+
+            n00 = corner(iy0, ix0, ty, tx)
+            n10 = corner(iy0, ix1, ty, tx - 1.0)
+            n01 = corner(iy1, ix0, ty - 1.0, tx)
+            n11 = corner(iy1, ix1, ty - 1.0, tx - 1.0)
+            sx = (tx * tx * (3.0 - 2.0 * tx))[None, :]
+            sy = (ty * ty * (3.0 - 2.0 * ty))[:, None]
+            n0 = n00 + (n10 - n00) * sx
+            n1 = n01 + (n11 - n01) * sx
+            total += (n0 + (n1 - n0) * sy) / s
+            amp += 1.0 / s
+        return numpy.clip(0.5 + total / amp, 0.0, 1.0)
+
+
+def _hsl_value(n1, n2, hue):
+    if hue > 6.0:
+        hue -= 6.0
+    elif hue < 0.0:
+        hue += 6.0
+    if hue < 1.0:
+        return n1 + (n2 - n1) * hue
+    elif hue < 3.0:
+        return n2
+    elif hue < 4.0:
+        return n1 + (n2 - n1) * (4.0 - hue)
+    return n1
+
+
+def colorize(v, hue, saturation, lightness):
+    """gimp-colorize a gray image. v : 0.0 - 1.0. Return (h, w, 3) 0 - 255."""
+    lum = v
+    if lightness > 0:
+        lum = lum * (100.0 - lightness) / 100.0 + (1.0 - (100.0 - lightness) / 100.0)
+    elif lightness < 0:
+        lum = lum * (lightness + 100.0) / 100.0
+
+    s = saturation / 100.0
+    h = hue / 360.0 * 6.0
+    if s == 0.0:
+        return numpy.dstack([lum, lum, lum]) * 255.0
+
+    n2 = numpy.where(lum <= 0.5, lum * (1.0 + s), lum + s - lum * s)
+    n1 = 2.0 * lum - n2
+    r = _hsl_value(n1, n2, h + 2.0)
+    g = _hsl_value(n1, n2, h)
+    b = _hsl_value(n1, n2, h - 2.0)
+    return numpy.rint(numpy.dstack([r, g, b]) * 255.0)
+
+
+def rgb_to_hsv(rgb):
+    """(h, w, 3) 0 - 255 -> hue 0 - 360, saturation 0 - 255, value 0 - 255."""
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    mx = numpy.max(rgb, axis=2)
+    mn = numpy.min(rgb, axis=2)
+    d = mx - mn
+    dd = numpy.where(d > 0, d, 1.0)
+    s = numpy.where(mx > 0, d * 255.0 / numpy.where(mx > 0, mx, 1.0), 0.0)
+    h = numpy.where(r == mx, (g - b) / dd,
+                    numpy.where(g == mx, 2.0 + (b - r) / dd, 4.0 + (r - g) / dd))
+    h = numpy.where(d > 0, (h * 60.0) % 360.0, 0.0)
+    return h, s, mx
+
+
+def hsv_to_rgb(h, s, v):
+    """hue 0 - 360, saturation 0 - 255, value 0 - 255 -> (h, w, 3) 0 - 255."""
+    s = s / 255.0
+    hh = (h % 360.0) / 60.0
+    i = numpy.floor(hh)
+    f = hh - i
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+    i = i.astype(numpy.intp) % 6
+    r = numpy.choose(i, [v, q, p, p, t, v])
+    g = numpy.choose(i, [t, v, v, q, p, p])
+    b = numpy.choose(i, [p, p, t, v, v, q])
+    return numpy.rint(numpy.dstack([r, g, b]))
+
+
+class PixelRandom(object):
+    """random_sample() of a band from absolute pixel coordinates.
+
+    Each value depends only on the seed, the call count and the pixel
+    position (x, y0 + row), so any band size gives the same image.
+    """
+
+    def __init__(self, seed, y0):
+        self.seed = seed & 0xffffffff
+        self.y0 = y0
+        self.count = 0
+
+    def random_sample(self, shape):
+        """Get shape (rows, w) values 0.0 - 1.0, like RandomState."""
+        h, w = shape
+        u32 = numpy.uint32
+        y = numpy.arange(self.y0, self.y0 + h, dtype=u32)[:, None]
+        x = numpy.arange(w, dtype=u32)[None, :]
+        k = u32((self.seed + self.count * 0x9e3779b9) & 0xffffffff)
+        self.count += 1
+
+        # murmur3 finalizer of (x, y, seed, count)
+        v = (x * u32(0xcc9e2d51)) ^ (y * u32(0x1b873593)) ^ k
+        v ^= v >> u32(16)
+        v *= u32(0x85ebca6b)
+        v ^= v >> u32(13)
+        v *= u32(0xc2b2ae35)
+        v ^= v >> u32(16)
+        return (v >> u32(8)).astype(numpy.float64) / 16777216.0
+
+
+def _randomize(rng, now, lo, hi, wrap, dist, holdness):
+    steps = hi - lo + 1
+    rnd = rng.random_sample(now.shape).astype(numpy.float32)
+    for i in range(1, holdness):
+        rnd = numpy.minimum(rnd, rng.random_sample(now.shape).astype(numpy.float32))
+    flag = numpy.where(rng.random_sample(now.shape) < 0.5, -1.0, 1.0)
+    v = now + flag * numpy.fmod(numpy.floor(dist * rnd), steps)
+    if wrap:
+        return numpy.where(v < lo, v + steps, numpy.where(v > hi, v - steps, v))
+    return numpy.clip(v, lo, hi)
+
+
+def hsv_noise(rgb, rng, holdness, hue, saturation, value):
+    """plug-in-hsv-noise. rgb : (h, w, 3) 0 - 255."""
+    h, s, v = rgb_to_hsv(rgb)
+    if hue > 0:
+        h = _randomize(rng, numpy.floor(h), 0, 359, True, hue, holdness)
+    if saturation > 0:
+        s = numpy.where(s > 0, _randomize(rng, s, 0, 255, False, saturation, holdness), s)
+    if value > 0:
+        v = _randomize(rng, v, 0, 255, False, value, holdness)
+    return hsv_to_rgb(h, s, v)
+
+
+def blend(a, b, mode, opacity=1.0):
+    """Legacy GIMP layer mode. a : bottom (h, w, 3), b : layer, 0 - 255."""
+    if b.ndim == 2:
+        b = b[:, :, None]
+    if mode == "multiply":
+        c = a * b / 255.0
+    elif mode == "divide":
+        c = numpy.minimum(a * 256.0 / (b + 1.0), 255.0)
+    elif mode == "screen":
+        c = 255.0 - (255.0 - a) * (255.0 - b) / 255.0
+    elif mode == "burn":
+        c = 255.0 - numpy.minimum((255.0 - a) * 256.0 / (b + 1.0), 255.0)
+    elif mode == "softlight":
+        m = a * b / 255.0
+        sc = 255.0 - (255.0 - a) * (255.0 - b) / 255.0
+        c = ((255.0 - a) * m + a * sc) / 255.0
+    else:
+        raise ValueError("unknown layer mode : %s" % mode)
+
+    if opacity < 1.0:
+        c = a + (c - a) * opacity
+    return numpy.clip(c, 0.0, 255.0)
+
+
+def makeup_band(gray, y0, y1, noises):
+    """Makeup rows y0 - y1. Return (y1 - y0, w, 3) float 0 - 255."""
+    h, w = gray.shape
+    m = get_margin()
+    rows = numpy.clip(numpy.arange(y0 - m, y1 + m), 0, h - 1)
+    a = numpy.pad(gray[rows].astype(numpy.float32), ((0, 0), (m, m)), "edge")
+
+    img = numpy.repeat(_shifted(a, m, 0, 0)[:, :, None], 3, axis=2)
+    img = blend(img, emboss(a, m, *EMBOSS), "multiply")
+    g = gauss(a, m, GAUSS_RADIUS)
+    img = blend(img, g, "divide", 0.5)
+    img = blend(img, g, "softlight", 0.5)
+    img = blend(img, 255.0 - edge_laplace(a, m, EDGE_AMOUNT), "multiply")
+
+    for noise, layer in zip(noises, NOISE_LAYERS):
+        seed, col, mode, opacity, rotate, hsv = layer
+        if rotate:
+            v = noise.get(w, h, h - y1, h - y0)[::-1, ::-1]
+        else:
+            v = noise.get(w, h, y0, y1)
+        c = colorize(v, *col)
+        if hsv is not None:
+            rng = PixelRandom(seed, y0)
+            c = hsv_noise(c, rng, *hsv)
+        img = blend(img, c, mode, opacity)
+    return img
+
+
+def makeup(gray, band=BAND):
+    """Makeup gray bump texture.
+
+    gray : (h, w) uint8 array.
+    band : rows per band (memory use). Same result for any size.
+    Return (h, w, 3) uint8 RGB array.
+    """
+    h, w = gray.shape
+    noises = [SolidNoise(d[0]) for d in NOISE_LAYERS]
+    dst = numpy.empty((h, w, 3), numpy.uint8)
+    for y0 in range(0, h, band):
+        y1 = min([y0 + band, h])
+        dst[y0:y1] = numpy.rint(makeup_band(gray, y0, y1, noises))
+    return dst
+
+
+def surface_to_gray(surface):
+    """Get (h, w) uint8 array from a gray pycairo ARGB32 or A8 surface."""
+    import cairo
+
+    surface.flush()
+    w, h, stride = surface.get_width(), surface.get_height(), surface.get_stride()
+    a = numpy.frombuffer(surface.get_data(), numpy.uint8).reshape(h, stride)
+    if surface.get_format() == cairo.FORMAT_A8:
+        # render_texture_gray()
+        return a[:, :w].copy()
+    # green byte of native endian ARGB32
+    g = 1 if sys.byteorder == "little" else 2
+    return a[:, g:w * 4:4].copy()
+
+
+def makeup_surface(surface, band=BAND):
+    """Makeup SciFiTex.generate() surface. Return (h, w, 3) uint8 RGB array."""
+    return makeup(surface_to_gray(surface), band)
+
+
+def makeup_pil_image(surface, band=BAND):
+    """Makeup SciFiTex.generate() surface. Return PIL Image (RGB)."""
+    from PIL import Image
+
+    return Image.fromarray(makeup_surface(surface, band))
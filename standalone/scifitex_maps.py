@@ -0,0 +1,162 @@
+#!python
+# -*- mode: python; Encoding: utf-8; coding: utf-8 -*-
+"""
+Normal map, AO and roughness from a Sci-Fi bump texture (NumPy).
+
+Takes the SciFiTex.generate() surface in memory (gray = height)
+and derives :
+
+    normal     tangent space normal map (Sobel), RGB
+    ao         cheap cavity / ambient occlusion, gray
+    roughness  roughness mask (slopes and cavities rougher), gray
+
+usage:
+    from scifitex_maps import get_maps, render_texture_maps
+    maps = get_maps(gray)       # dict of uint8 arrays
+    surface, seed, maps = render_texture_maps(params)
+
+Author: mieki256
+License: CC0 / Public Domain
+require: Python, NumPy (Pillow for save_maps())
+
+"""
+
+import os
+
+import numpy
+
+from scifitex import render_texture
+from scifitex_makeup import surface_to_gray
+
+
+BAND = 256
+
+MAP_KIND = ["normal", "ao", "roughness"]
+
+# normal : height scale (bigger = steeper)
+NORMAL_STRENGTH = 2.0
+
+# ao : box blur radius, cavity depth scale
+AO_RADIUS = 8
+AO_STRENGTH = 4.0
+
+# roughness = base + slope * SLOPE + (1 - ao) * CAVITY
+ROUGH_BASE = 0.35
+ROUGH_SLOPE = 0.4
+ROUGH_CAVITY = 0.5
+
+
+def _shifted(a, m, dy, dx):
+    h, w = a.shape[0] - m * 2, a.shape[1] - m * 2
+    return a[m + dy:m + dy + h, m + dx:m + dx + w]
+
+
+def sobel(a, m):
+    """Sobel gradient (per pixel) of a with m pixel margin. Return (gx, gy)."""
+    def s(dy, dx):
+        return _shifted(a, m, dy, dx)
+
+    gx = ((s(-1, 1) + s(0, 1) * 2.0 + s(1, 1))
+          - (s(-1, -1) + s(0, -1) * 2.0 + s(1, -1))) / 8.0
+    gy = ((s(1, -1) + s(1, 0) * 2.0 + s(1, 1))
+          - (s(-1, -1) + s(-1, 0) * 2.0 + s(-1, 1))) / 8.0
+    return gx, gy
+
+
+def box_blur(a, m, r):
+    """Separable box blur (2r + 1) of a with m pixel margin. Use cumsum."""
+    h, w = a.shape[0] - m * 2, a.shape[1] - m * 2
+    n = float(r * 2 + 1)
+    c = numpy.cumsum(a, axis=1, dtype=numpy.float64)
+    c = numpy.pad(c, ((0, 0), (1, 0)), "constant")
+    t = (c[:, m + r + 1:m + r + 1 + w] - c[:, m - r:m - r + w]) / n
+    c = numpy.cumsum(t, axis=0)
+    c = numpy.pad(c, ((1, 0), (0, 0)), "constant")
+    return ((c[m + r + 1:m + r + 1 + h] - c[m - r:m - r + h]) / n).astype(numpy.float32)
+
+
+def get_maps_band(gray, y0, y1, kinds, strength, flip_y):
+    """Get maps of rows y0 - y1. Return dict of float arrays 0.0 - 1.0."""
+    h, w = gray.shape
+    m = AO_RADIUS + 1
+    rows = numpy.clip(numpy.arange(y0 - m, y1 + m), 0, h - 1)
+    a = gray[rows].astype(numpy.float32)
+    if gray.dtype == numpy.uint8:
+        a = a / 255.0
+    a = numpy.pad(a, ((0, 0), (m, m)), "edge")
+
+    res = {}
+    gx, gy = sobel(a, m)
+
+    if "normal" in kinds:
+        # image y is down. OpenGL style (green = up) by default
+        nx = -gx * strength
+        ny = gy * strength if not flip_y else -gy * strength
+        ln = numpy.sqrt(nx * nx + ny * ny + 1.0)
+        res["normal"] = numpy.dstack([nx / ln, ny / ln, 1.0 / ln]) * 0.5 + 0.5
+
+    if "ao" in kinds or "roughness" in kinds:
+        cavity = numpy.maximum(box_blur(a, m, AO_RADIUS) - _shifted(a, m, 0, 0), 0.0)
+        ao = numpy.clip(1.0 - cavity * AO_STRENGTH, 0.0, 1.0)
+        if "ao" in kinds:
+            res["ao"] = ao
+
+        if "roughness" in kinds:
+            slope = numpy.clip(numpy.sqrt(gx * gx + gy * gy) * strength, 0.0, 1.0)
+            res["roughness"] = numpy.clip(ROUGH_BASE + slope * ROUGH_SLOPE
+                                          + (1.0 - ao) * ROUGH_CAVITY, 0.0, 1.0)
+    return res
+
+
+def get_maps(gray, kinds=None, strength=NORMAL_STRENGTH, flip_y=False, band=BAND):
+    """Get normal / ao / roughness maps from a height (bump) image.
+
+    gray : (h, w) uint8 array, or float heights 0.0 - 1.0
+           (scifitex_height.render_texture_height()).
+    kinds : list of MAP_KIND (default: all).
+    flip_y : True = DirectX style normal map (green = down).
+    Return {kind: uint8 array}. normal is (h, w, 3), others (h, w).
+    """
+    if kinds is None:
+        kinds = MAP_KIND
+    h, w = gray.shape
+    maps = {}
+    for k in kinds:
+        if k not in MAP_KIND:
+            raise ValueError("unknown map : %s" % k)
+        maps[k] = numpy.empty((h, w, 3) if k == "normal" else (h, w), numpy.uint8)
+
+    for y0 in range(0, h, band):
+        y1 = min([y0 + band, h])
+        res = get_maps_band(gray, y0, y1, kinds, strength, flip_y)
+        for k in kinds:
+            maps[k][y0:y1] = numpy.rint(res[k] * 255.0)
+    return maps
+
+
+def get_surface_maps(surface, kinds=None, strength=NORMAL_STRENGTH, flip_y=False):
+    """get_maps() for a SciFiTex.generate() surface."""
+    return get_maps(surface_to_gray(surface), kinds, strength, flip_y)
+
+
+def render_texture_maps(params, kinds=None, stats=None):
+    """Render one texture and its maps in one call.
+
+    Return (surface, seed, maps). See scifitex.render_texture().
+    """
+    surface, seed = render_texture(params, stats)
+    return surface, seed, get_surface_maps(surface, kinds)
+
+
+def save_maps(maps, path):
+    """Save maps as NAME_KIND.png. Return saved file paths."""
+    from PIL import Image
+
+    base = os.path.splitext(path)[0]
+    paths = []
+    for k in MAP_KIND:
+        if k in maps:
+            fn = "%s_%s.png" % (base, k)
+            Image.fromarray(maps[k]).save(fn)
+            paths.append(fn)
+    return paths
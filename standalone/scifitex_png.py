@@ -0,0 +1,195 @@
+#!python
+# -*- mode: python; Encoding: utf-8; coding: utf-8 -*-
+"""
+Streaming png writer for scifitex (zlib, no Pillow).
+
+Rows are compressed as they come and written out in IDAT chunks,
+so a texture can be written while it is rendered row band by row
+band. Only one band and one tile are held in memory, a few MB even
+for 16384 x 16384. Output is grayscale (the bump map is gray), no
+RGB copy of the image is made.
+
+usage:
+    from scifitex_png import write_texture_png, write_surface_png
+    seed = write_texture_png(params, "out.png")    # render + write
+    write_surface_png(surface, "out.png")          # rendered surface
+
+Author: mieki256
+License: CC0 / Public Domain
+require: Python, pycairo (NumPy for write_height_png16())
+
+"""
+
+import struct
+import zlib
+
+import cairo
+
+from scifitex import RGBA_ORDER, get_params, render_texture_tiles, copy_gray
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# write compressed data in chunks of about this size
+IDAT_SIZE = 256 * 1024
+
+BAND = 256
+
+
+class PngWriter(object):
+    """Write a grayscale png to a file object, rows at a time.
+
+    bitdepth : 8 or 16 (16 bit samples are big endian).
+    Call write_rows() until all h rows are written, then close().
+    close() does not close the file object.
+    """
+
+    def __init__(self, f, w, h, bitdepth=8, level=6):
+        if bitdepth not in [8, 16]:
+            raise ValueError("bitdepth must be 8 or 16")
+        self.f = f
+        self.width = w
+        self.height = h
+        self.rowbytes = w * bitdepth // 8
+        self.rows = 0
+        self.zobj = zlib.compressobj(level)
+        self.pending = []
+        self.pending_size = 0
+
+        f.write(PNG_SIGNATURE)
+        # gray, no interlace
+        self.write_chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, bitdepth, 0, 0, 0, 0))
+
+    def write_chunk(self, kind, data):
+        crc = zlib.crc32(data, zlib.crc32(kind)) & 0xffffffff
+        self.f.write(struct.pack(">I", len(data)) + kind)
+        self.f.write(data)
+        self.f.write(struct.pack(">I", crc))
+
+    def add_compressed(self, data, flush=False):
+        if data:
+            self.pending.append(data)
+            self.pending_size += len(data)
+        if self.pending_size >= IDAT_SIZE or (flush and self.pending_size > 0):
+            self.write_chunk(b"IDAT", b"".join(self.pending))
+            self.pending = []
+            self.pending_size = 0
+
+    def write_rows(self, data):
+        """Write rows. data : raw samples of whole rows (no filter byte)."""
+        n = self.rowbytes
+        count = len(data) // n
+        if count * n != len(data):
+            raise ValueError("data is not whole rows")
+        if self.rows + count > self.height:
+            raise ValueError("too many rows")
+        # filter type 0 (None) per row
+        raw = b"".join([b"\0" + bytes(data[i * n:(i + 1) * n]) for i in range(count)])
+        self.add_compressed(self.zobj.compress(raw))
+        self.rows += count
+
+    def close(self):
+        """Finish the png. All rows must be written."""
+        if self.rows != self.height:
+            raise ValueError("%d rows written, %d expected" % (self.rows, self.height))
+        self.add_compressed(self.zobj.flush(), True)
+        self.write_chunk(b"IEND", b"")
+
+
+def write_surface_png(surface, path, band=BAND):
+    """Write a gray ARGB32 or A8 surface as an 8-bit grayscale png.
+
+    The gray (green byte) is taken band rows at a time, so there is no
+    full size RGB / gray copy.
+    """
+    surface.flush()
+    w, h, stride = surface.get_width(), surface.get_height(), surface.get_stride()
+    data = surface.get_data()
+    a8 = surface.get_format() == cairo.FORMAT_A8
+    g = RGBA_ORDER[1]
+    with open(path, "wb") as f:
+        writer = PngWriter(f, w, h)
+        for y0 in range(0, h, band):
+            rows = []
+            for y in range(y0, min([y0 + band, h])):
+                s = y * stride
+                if a8:
+                    rows.append(bytes(data[s:s + w]))
+                else:
+                    rows.append(bytes(data[s:s + w * 4])[g::4])
+            writer.write_rows(b"".join(rows))
+        writer.close()
+
+
+def write_bands(path, w, h, bitdepth, bands):
+    """Write (rows data) of bands from a generator as a png."""
+    with open(path, "wb") as f:
+        writer = PngWriter(f, w, h, bitdepth)
+        for data in bands:
+            writer.write_rows(data)
+        writer.close()
+
+
+def get_gray_bands(tiles, w, tile):
+    """Collect render_texture_tiles() tiles to 8-bit gray row bands.
+
+    Tiles come row by row, so a band is done when the next row starts.
+    Yield band data (w x band height bytes).
+    """
+    band = bytearray(w * tile)
+    by, bh = 0, 0
+    for x, y, surface in tiles:
+        if y != by:
+            yield band[:w * bh]
+            by = y
+        bh = surface.get_height()
+        copy_gray(surface, band, w, x, 0)
+        surface.finish()
+    yield band[:w * bh]
+
+
+def write_texture_png(params, path, tile=BAND, stats=None):
+    """Render one texture and write an 8-bit grayscale png band by band.
+
+    Memory is one band (imgsize x tile bytes) and one tile.
+    Same image as scifitex.render_texture_gray(). Return seed.
+    """
+    w = h = int(get_params(params)["imgsize"])
+    seed, tiles = render_texture_tiles(params, tile, stats)
+    write_bands(path, w, h, 8, get_gray_bands(tiles, w, tile))
+    return seed
+
+
+def get_height_bands(tiles, w, tile):
+    """Like get_gray_bands(), 16-bit big endian from float tiles."""
+    import numpy
+    from scifitex_height import surface_to_height
+
+    band = numpy.empty((tile, w), ">u2")
+    by, bh = 0, 0
+    for x, y, surface in tiles:
+        if y != by:
+            yield band[:bh].tobytes()
+            by = y
+        a = numpy.clip(surface_to_height(surface), 0.0, 1.0)
+        bh, tw = a.shape
+        band[:bh, x:x + tw] = numpy.rint(a * 65535.0)
+        surface.finish()
+    yield band[:bh].tobytes()
+
+
+def write_height_png16(params, path, tile=BAND, stats=None):
+    """Render float heights and write a 16-bit grayscale png band by band.
+
+    See scifitex_height.render_texture_height(). Memory is one band
+    (imgsize x tile x 2 bytes) and one float tile. Return seed.
+    """
+    from scifitex_height import FORMAT_FLOAT, has_float_format
+
+    if not has_float_format():
+        raise RuntimeError("high precision needs cairo >= 1.17.2 and pycairo"
+                           " with FORMAT_RGBA128F (cairo %s)" % cairo.cairo_version_string())
+    w = h = int(get_params(params)["imgsize"])
+    seed, tiles = render_texture_tiles(params, tile, stats, FORMAT_FLOAT)
+    write_bands(path, w, h, 16, get_height_bands(tiles, w, tile))
+    return seed
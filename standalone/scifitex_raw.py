@@ -0,0 +1,217 @@
+#!python
+# -*- mode: python; Encoding: utf-8; coding: utf-8 -*-
+"""
+Memory-mapped raw image files for giant Sci-Fi textures.
+
+The texture is rendered straight into a file mapping
+(mmap + cairo.ImageSurface.create_for_data()), not into a heap
+surface, so the OS can page it out and other tools can read the
+pixels without decoding a png.
+
+File layout:
+    header (HEADER_SIZE bytes, little endian, zero padded)
+        magic      8s   b"SCIFIRAW"
+        version    uint32
+        header     uint32  header size = offset of pixel data
+        width      uint32
+        height     uint32
+        stride     uint32  bytes per row
+        format     uint32  cairo format (0: ARGB32, 2: A8, 7: RGBA128F)
+        bigendian  uint32  byte order of the pixels (ARGB32 is a native uint32)
+        seed       int64
+    pixels (stride x height bytes)
+
+usage:
+    python scifitex_raw.py FILE                 # show header
+    python scifitex_raw.py FILE -o out.png      # to grayscale png
+
+    from scifitex_raw import RawImage, render_texture_raw
+    raw, seed = render_texture_raw(params, "out.raw")
+    raw.close()
+    raw = RawImage("out.raw")
+    gray = raw.get_gray()       # (h, w) array on the mapping
+
+Author: mieki256
+License: CC0 / Public Domain
+require: Python 3.x, pycairo (NumPy for get_array(), get_gray())
+
+"""
+
+import sys
+import mmap
+import struct
+import argparse
+
+import cairo
+
+from scifitex import get_params, render_texture
+
+
+MAGIC = b"SCIFIRAW"
+RAW_VERSION = 1
+
+# page aligned pixel data
+HEADER_SIZE = 4096
+HEADER_FORMAT = "<8s7Iq"
+SEED_OFFSET = struct.calcsize("<8s7I")
+
+FORMAT_NAME = {
+    cairo.FORMAT_ARGB32: "ARGB32",
+    cairo.FORMAT_RGB24: "RGB24",
+    cairo.FORMAT_A8: "A8",
+}
+FORMAT_FLOAT = getattr(cairo, "FORMAT_RGBA128F", None)
+if FORMAT_FLOAT is not None:
+    FORMAT_NAME[FORMAT_FLOAT] = "RGBA128F"
+
+
+class RawImage(object):
+    """Raw image file mapped to memory.
+
+    access : mmap.ACCESS_READ (default), ACCESS_WRITE or ACCESS_COPY.
+    width, height, stride, format (cairo format), bigendian, seed.
+    surface : cairo.ImageSurface on the mapping. None with ACCESS_READ
+              (cairo needs a writable buffer, ACCESS_COPY does not
+              change the file).
+    Drop other references to surface and arrays before close().
+    """
+
+    def __init__(self, path, access=mmap.ACCESS_READ):
+        self.path = path
+        self.view = None
+        self.surface = None
+        self.f = open(path, "rb" if access == mmap.ACCESS_READ else "r+b")
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=access)
+        (magic, version, self.header_size, self.width, self.height, self.stride,
+         self.format, self.bigendian, self.seed) = struct.unpack_from(HEADER_FORMAT, self.mm)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("not a scifitex raw file : %s" % path)
+        if version > RAW_VERSION:
+            self.close()
+            raise ValueError("unknown raw file version %d : %s" % (version, path))
+
+        if access != mmap.ACCESS_READ:
+            n = self.stride * self.height
+            self.view = memoryview(self.mm)[self.header_size:self.header_size + n]
+            self.surface = cairo.ImageSurface.create_for_data(
+                self.view, self.format, self.width, self.height, self.stride)
+
+    @staticmethod
+    def create(path, w, h, fmt=cairo.FORMAT_ARGB32, seed=0):
+        """Create a raw file (pixels zero filled) and open it for writing."""
+        stride = cairo.ImageSurface.format_stride_for_width(fmt, w)
+        header = struct.pack(HEADER_FORMAT, MAGIC, RAW_VERSION, HEADER_SIZE, w, h, stride,
+                             fmt, 1 if sys.byteorder == "big" else 0, seed)
+        with open(path, "wb") as f:
+            f.write(header.ljust(HEADER_SIZE, b"\0"))
+            f.truncate(HEADER_SIZE + stride * h)
+        return RawImage(path, mmap.ACCESS_WRITE)
+
+    def set_seed(self, seed):
+        self.seed = seed
+        struct.pack_into("<q", self.mm, SEED_OFFSET, seed)
+
+    def get_info(self):
+        return "%s : %d x %d, %s, stride %d, %s endian, seed %d" % (
+            self.path, self.width, self.height,
+            FORMAT_NAME.get(self.format, "format %d" % self.format), self.stride,
+            "big" if self.bigendian else "little", self.seed)
+
+    def get_array(self):
+        """Get numpy array on the mapping (no copy).
+
+        ARGB32, RGB24 : (h, w) uint32, A8 : (h, w) uint8,
+        RGBA128F : (h, w, 4) float32 (R, G, B, A).
+        """
+        import numpy
+
+        e = ">" if self.bigendian else "<"
+        if self.format in [cairo.FORMAT_ARGB32, cairo.FORMAT_RGB24]:
+            dtype, n = e + "u4", 1
+        elif self.format == cairo.FORMAT_A8:
+            dtype, n = "u1", 1
+        elif self.format == FORMAT_FLOAT:
+            dtype, n = e + "f4", 4
+        else:
+            raise ValueError("unsupported format %d" % self.format)
+
+        dt = numpy.dtype(dtype)
+        a = numpy.frombuffer(self.mm, dt, self.stride * self.height // dt.itemsize,
+                             self.header_size)
+        a = a.reshape(self.height, self.stride // dt.itemsize)[:, :self.width * n]
+        return a.reshape(self.height, self.width, 4) if n == 4 else a
+
+    def get_gray(self):
+        """Get (h, w) gray : uint8 (ARGB32, RGB24, A8) or float32 (RGBA128F)."""
+        a = self.get_array()
+        if self.format == cairo.FORMAT_A8:
+            return a
+        if self.format == FORMAT_FLOAT:
+            return a[:, :, 1]
+        return ((a >> 8) & 0xff).astype("u1")
+
+    def flush(self):
+        if self.surface is not None:
+            self.surface.flush()
+        if self.view is not None:
+            self.mm.flush()
+
+    def close(self):
+        if self.surface is not None:
+            self.surface.finish()
+            self.surface = None
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        self.f.close()
+
+
+def render_texture_raw(params, path, stats=None):
+    """Render one texture from a parameter dict into a raw file.
+
+    Drawn with SciFiTex.generate(target=...) on the file mapping, same
+    image as scifitex.render_texture(). Return (RawImage, seed),
+    call close() of RawImage when done.
+    """
+    p = get_params(params)
+    p["scale"] = 1.0
+    w = h = int(p["imgsize"])
+    raw = RawImage.create(path, w, h)
+    try:
+        _, seed = render_texture(p, stats, target=(raw.surface, 0, 0))
+        raw.set_seed(seed)
+        raw.flush()
+    except Exception:
+        raw.close()
+        raise
+    return raw, seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="scifitex raw file reader")
+    parser.add_argument("file")
+    parser.add_argument("-o", "--output", metavar="PNG",
+                        help="save as grayscale png (ARGB32, RGB24, A8)")
+    args = parser.parse_args()
+
+    if args.output:
+        from scifitex_png import write_surface_png
+
+        raw = RawImage(args.file, mmap.ACCESS_COPY)
+        print(raw.get_info())
+        if raw.format not in [cairo.FORMAT_ARGB32, cairo.FORMAT_RGB24, cairo.FORMAT_A8]:
+            raw.close()
+            parser.error("png : ARGB32, RGB24, A8 only")
+        write_surface_png(raw.surface, args.output)
+    else:
+        raw = RawImage(args.file)
+        print(raw.get_info())
+    raw.close()
+
+
+if __name__ == "__main__":
+    main()